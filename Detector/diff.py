@@ -0,0 +1,161 @@
+import argparse
+import hashlib
+import json
+from main import Detector, mmformat
+
+
+# Findings added and resolved between two metamodels (e.g. before and after a
+# merge). Every microservice gets one hash per fact set; only the rules
+# reading a fact set that changed (see "facts" in Detector.RULES) are
+# evaluated again, on both metamodels, and only their differences printed.
+#   python diff.py --baseline ../metamodel-main.json --metamodel ../metamodel.json
+#   python diff.py --baseline old.mmb --metamodel new.mmb --output ../diff.json
+
+# Fact set -> fields of a microservice
+FACTS = {
+    "size": [("locs",), ("nb_files",), ("sample",)],
+    "language": [("language",)],
+    "dependencies": [("dependencies",)],
+    "imports": [("code", "imports")],
+    "annotations": [("code", "annotations")],
+    "methods": [("code", "methods")],
+    "http": [("code", "http")],
+    "databases": [("code", "databases")],
+    "config": [("config",)],
+    "deployment": [("deployment",)]
+}
+
+# Content of the analysed files, read by some rules (apiVersion searched in
+# configuration files) : no field of the metamodel covers it, so it always
+# counts as changed and the rules reading it are always evaluated again
+FILES = "files"
+
+# System fields no rule reads
+_UNREAD = ("revision", "quarantine")
+
+
+def _field(service, path):
+    for key in path:
+        if not isinstance(service, dict):
+            return None
+        service = service.get(key)
+    return service
+
+
+def _digest(value, root):
+    text = json.dumps(value, sort_keys=True, separators=(",", ":"))
+    # Metamodels of git revisions have their own root in every path
+    if root:
+        text = text.replace(root + "/", "")
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+# (hash of the system fields, {service name: {fact set: hash}}), the
+# metamodel being streamed one microservice at a time
+def fingerprints(path):
+    system = hashlib.blake2b(digest_size=16)
+    services = dict()
+    root = None
+    for key, value in mmformat.stream(path):
+        if key == "revision" and value:
+            root = value["root"]
+        if key == "microservices":
+            services[value["name"]] = dict((fact, _digest([_field(value, p) for p in paths], root))
+                                           for fact, paths in FACTS.items())
+        elif key not in _UNREAD:
+            system.update((key + "=" + _digest(value, root) + "\n").encode("utf-8"))
+    return system.hexdigest(), services
+
+
+# Fact sets changed anywhere, and per microservice what changed
+def changes(old, new):
+    changed = set([FILES])
+    services = dict()
+    if old[0] != new[0]:
+        changed.add("system")
+    for name in list(old[1]) + [n for n in new[1] if n not in old[1]]:
+        if name not in new[1]:
+            services[name] = "removed"
+        elif name not in old[1]:
+            services[name] = "added"
+        else:
+            facts = [fact for fact in FACTS if old[1][name][fact] != new[1][name][fact]]
+            if facts:
+                services[name] = facts
+            changed.update(facts)
+            continue
+        # A service coming or going changes every fact set of the system
+        changed.update(FACTS)
+    return changed, services
+
+
+def affectedrules(changed):
+    return [rule for rule in Detector.RULES if changed & set(Detector.RULES[rule]["facts"])]
+
+
+def findings(path, rules, tools):
+    detector = Detector(rules=rules, tools=tools)
+    detector.getResults(mmformat.stream(path))
+    return detector.getFindings()
+
+
+# Pairs are found in either direction
+def _key(finding):
+    return tuple(sorted(finding)) if isinstance(finding, list) else finding
+
+
+def compare(before, after):
+    added = dict()
+    resolved = dict()
+    for rule in after:
+        previous = set(_key(f) for f in before[rule])
+        current = set(_key(f) for f in after[rule])
+        added[rule] = [f for f in after[rule] if _key(f) not in previous]
+        resolved[rule] = [f for f in before[rule] if _key(f) not in current]
+    return added, resolved
+
+
+def _describe(finding):
+    return " <-> ".join(finding) if isinstance(finding, list) else finding
+
+
+def printdiff(services, rules, added, resolved):
+    print("Changed microservices : ")
+    print("=======================")
+    for name, facts in services.items():
+        print("- " + name + " : " + (facts if isinstance(facts, str) else ", ".join(facts)))
+    print("\n")
+    print("Rules evaluated again : {nb} of {total}".format(nb=len(rules), total=len(Detector.RULES)))
+    print("\n".join("- " + rule for rule in rules))
+    print("\n")
+    for title, found in (("Added antipatterns : ", added), ("Resolved antipatterns : ", resolved)):
+        print(title)
+        print("=" * (len(title) - 1))
+        for rule, items in found.items():
+            for item in items:
+                print("- " + rule + " : " + _describe(item))
+        print("\n")
+
+
+def run(args):
+    old = fingerprints(args.baseline)
+    new = fingerprints(args.metamodel)
+    changed, services = changes(old, new)
+    rules = affectedrules(changed)
+    added, resolved = dict(), dict()
+    if rules:
+        tools = dict()
+        added, resolved = compare(findings(args.baseline, rules, tools),
+                                  findings(args.metamodel, rules, tools))
+    printdiff(services, rules, added, resolved)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump({"changed": services, "rules": rules, "added": added, "resolved": resolved}, output, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--baseline", type=str, required=True)
+    parser.add_argument("--metamodel", type=str, required=True)
+    parser.add_argument("--output", type=str, default=None)
+    run(parser.parse_args())
@@ -1,7 +1,12 @@
-import json
+import os
+import sys
 import argparse
 import math
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Extractor"))
+import metamodel as mmformat
+import sources
+
 class Detector(object):
 
     # Constants to act as defaults
@@ -17,514 +22,691 @@ class Detector(object):
     MEGA_SERVICE_LOC_THRESHOLD = 1.5   # If LOCs > Threshold, it's likely a mega service -- 150% -- Service has 1.5 times higher LOCS
     MEGA_SERVICE_FILES_THRESHOLD = 1.5 # If NbFiles > Threshold, it's likely a mega service -- 150% -- Service has 1.5 times higher FILES
 
-
-    # Global needed vars
-    vars = dict()
-
-
-    # Storing info about antipatterns detected
-    _hasNano = dict()
-    _hasMega = dict()
-    _hasWrongCuts = dict()
-    _hasCircularDeps = dict()
-    _hasSharedLibs = dict()
-    _hasHardcodedEndpoints = dict()
-    _hasManualConfig = dict()
-    _hasNoCiCd = dict()
-    _hasNoApiGateway = dict()
-    _hasTimeouts = dict()
-    _hasMultipleInstancesPerHost = dict()
-    _hasSharedPersistence = dict()
-    _hasNoApiVersioning = dict()
-    _hasNoHealthCheck = dict()
-    _hasLocalLogging = dict()
-    _hasInsufficientMonitoring = dict()
-
-
-
-    def __init__(self, metamodel:dict) -> None:
+    # Facts taken from a sample of the source files (Extractor --sample),
+    # the rules reading them give approximate results
+    SAMPLED_FACTS = ("size", "imports", "annotations", "methods", "http", "databases")
+
+
+    # Rules, in report order. For each rule :
+    #   service : method evaluated on every service as it is read
+    #   system  : method evaluated once every service is read
+    #   print   : method printing its section of the report
+    #   inputs  : indexes it reads, only built when a selected rule needs them
+    #     sizes           : locs and files of every service, system averages
+    #     languages       : language of every service
+    #     importGraph     : MSa -> MSb when MSa imports MSb
+    #     dependencyIndex : dependency -> services using it
+    #     datasourceIndex : datasource -> services using it
+    #     dockerFiles     : services without a Dockerfile
+    #   catalogs : tools catalogs its dependencies are matched against
+    #   facts    : facts of the metamodel its results depend on, "system" being
+    #              every field of the system but the microservices and "files"
+    #              the content of analysed files read by the rule (see diff.py)
+    RULES = {
+        "nanoServices": {"system": "hasNanoService", "print": "printNanoServices", "inputs": ["sizes"],
+                         "facts": ["size"]},
+        "megaServices": {"system": "hasMegaService", "print": "printMegaServices", "inputs": ["sizes"],
+                         "facts": ["size"]},
+        "hardcodedEndpoints": {"service": "hasHardcodedEndpoints", "system": "hasSystemHardcodedEndpoints",
+                               "print": "printHardcodedEndpoints", "inputs": [],
+                               "catalogs": ["service_discovery"],
+                               "facts": ["dependencies", "http", "system"]},
+        "manualConfiguration": {"service": "hasManualConfiguration", "system": "hasSystemManualConfiguration",
+                                "print": "printManualConfiguration", "inputs": [],
+                                "catalogs": ["configuration"],
+                                "facts": ["dependencies", "config", "system"]},
+        "noApiGateway": {"service": "hasApiGateway", "system": "hasSystemApiGateway",
+                         "print": "printNoApiGateway", "inputs": [],
+                         "catalogs": ["gateway"],
+                         "facts": ["dependencies", "system"]},
+        "localLogging": {"service": "hasLocalLogging", "system": "hasSystemLocalLogging",
+                         "print": "printLocalLogging", "inputs": [],
+                         "catalogs": ["logging"],
+                         "facts": ["dependencies", "system"]},
+        "insufficientMonitoring": {"service": "hasInsufficientMonitoring", "system": "hasSystemInsufficientMonitoring",
+                                   "print": "printInsufficientMonitoring", "inputs": [],
+                                   "catalogs": ["monitoring"],
+                                   "facts": ["dependencies", "system"]},
+        "noCiCd": {"service": "hasCiCd", "print": "printNoCiCd", "inputs": [],
+                   "catalogs": ["cicd"],
+                   "facts": ["dependencies", "system"]},
+        "multipleInstancesPerHost": {"system": "hasMultipleServicesPerHost", "print": "printMultipleInstancesPerHost",
+                                     "inputs": ["dockerFiles"],
+                                     "facts": ["deployment", "system"]},
+        "noHealthCheck": {"service": "hasHealthCheck", "system": "hasSystemHealthCheck",
+                          "print": "printNoHealthCheck", "inputs": [],
+                          "catalogs": ["healthcheck"],
+                          "facts": ["dependencies", "imports", "annotations", "system"]},
+        "timeouts": {"service": "hasTimeouts", "system": "hasSystemTimeouts", "print": "printTimeouts", "inputs": [],
+                     "catalogs": ["circuit_breaker"],
+                     "facts": ["dependencies", "imports", "methods", "system"]},
+        "sharedPersistence": {"system": "hasSharedPersistence", "print": "printSharedPersistence",
+                              "inputs": ["datasourceIndex"],
+                              "facts": ["databases"]},
+        "wrongCuts": {"system": "hasWrongCuts", "print": "printWrongCuts", "inputs": ["importGraph", "languages"],
+                      "facts": ["language", "imports", "system"]},
+        "circularDependencies": {"system": "hasCircularDependencies", "print": "printCircularDependencies",
+                                 "inputs": ["importGraph"],
+                                 "facts": ["imports", "system"]},
+        "sharedDependencies": {"system": "hasSharedDependencies", "print": "printSharedDependencies",
+                               "inputs": ["dependencyIndex"],
+                               "facts": ["dependencies"]},
+        "noApiVersioning": {"service": "hasNoApiVersioning", "system": "hasSystemApiVersioning",
+                            "print": "printNoApiVersioning", "inputs": [],
+                            "facts": ["config", "deployment", "files", "system"]}
+    }
+
+
+    # Selected rules in report order : every rule by default, or the given
+    # ones, minus the skipped ones. Unknown names raise a ValueError.
+    @classmethod
+    def selectRules(cls, rules=None, skip=None):
+        for rule in list(rules or []) + list(skip or []):
+            if rule not in cls.RULES:
+                raise ValueError("Unknown rule " + rule + ", rules are " + ", ".join(cls.RULES))
+        return [rule for rule in cls.RULES if (not rules or rule in rules) and rule not in (skip or [])]
+
+
+    # The detector reads the metamodel one microservice at a time. Per-service
+    # rules are evaluated as soon as a service is read and only the compact
+    # indexes needed by the cross-service rules are kept (sizes, dependency and
+    # datasource indexes, import graph), so memory does not grow with the fact
+    # lists of every service.
+    # tools is a catalog cache shared between detectors (see the daemon),
+    # and rules the names of the rules to run (every rule by default).
+    def __init__(self, metamodel:dict = None, tools:dict = None, rules:list = None) -> None:
         self._metamodel = metamodel
-        self.buildVars()
-    
-
-    def buildVars(self):
-        self.vars["nbServices"] = self.vars.setdefault("nbServices", 0) + len(self._metamodel["system"]["microservices"])
-        self.vars["totalLocs"] = self.vars.setdefault("totalLocs", 0)
-        self.vars["totalFiles"] = self.vars.setdefault("totalFiles", 0)
+        self.rules = self.selectRules(rules)
+        self._inputs = set(i for rule in self.rules for i in self.RULES[rule]["inputs"])
+        self._serviceRules = [getattr(self, self.RULES[rule]["service"]) for rule in self.rules
+                              if "service" in self.RULES[rule]]
+
+        # Global needed vars
+        self.vars = dict()
+        self.vars["nbServices"] = 0
+        self.vars["totalLocs"] = 0
+        self.vars["totalFiles"] = 0
+        self.vars["avgLocs"] = 0
+        self.vars["avgFiles"] = 0
+        self.vars["hasCiCdFolders"] = False
+
+        # Storing info about antipatterns detected
+        self._hasNano = dict()
+        self._hasMega = dict()
+        self._hasWrongCuts = dict()
+        self._hasCircularDeps = dict()
+        self._hasSharedLibs = dict()
+        self._hasHardcodedEndpoints = dict()
+        self._hasManualConfig = dict()
+        self._hasNoCiCd = dict()
+        self._hasNoApiGateway = dict()
+        self._hasTimeouts = dict()
+        self._hasMultipleInstancesPerHost = dict()
+        self._hasSharedPersistence = dict()
+        self._hasNoApiVersioning = dict()
+        self._hasNoHealthCheck = dict()
+        self._hasLocalLogging = dict()
+        self._hasInsufficientMonitoring = dict()
+
+        # System fields, everything but the microservices
+        self._system = dict()
+
+        # Compact indexes kept for the rules needing every service
+        self._order = dict()          # name -> position
+        self._sizes = []              # (name, locs, nb_files)
+        self._locsRanges = dict()     # name -> (low, high), locs being estimated
+        self._languages = dict()      # name -> language
+        self._deps = dict()           # name -> dependencies
+        self._depIndex = dict()       # dependency -> names
+        self._datasources = dict()    # name -> datasources
+        self._datasourceIndex = dict()  # datasource -> names
+        self._importedNames = dict()  # name -> folder names found in its imports
+        self._imports = dict()        # name -> imports, only when folders are unknown
+        self._noDockerFile = []       # names
+        self._graph = dict()          # name -> imported names
+        self._calls = dict()          # name -> [(called name, url)], from system.calls
+
+        self._tools = tools if tools is not None else dict()
+        self._toolMatches = dict()
+
+
+    def loadTools(self, catalog):
+        if catalog not in self._tools:
+            with open("../tools/" + catalog + ".txt", "r") as toolsFile:
+                tools = toolsFile.readlines()
+                self._tools[catalog] = [line.rstrip() for line in tools]
+        return self._tools[catalog]
+
+
+    # Tools of the catalog found in the dependencies. Like the original loops,
+    # matches accumulate over the services already visited for this rule.
+    def matchTools(self, rule, catalog, dependencies):
+        res = self._toolMatches.setdefault(rule, [])
+        tools = self.loadTools(catalog)
+        for dependency in dependencies:
+            for tool in tools:
+                if (tool in dependency):
+                    res.append(tool)
+        return res
+
+
+    def visitSystem(self, key, value):
+        self._system[key] = value
+
+        # Metamodel of a git revision : files are read from its blobs
+        if key == "revision" and value and not sources.ismounted(value["root"]):
+            import gitsource
+            gitsource.mountrevision(value["repository"], value["commit"], value["root"])
+
+        if key == "calls":
+            for call in value:
+                self._calls.setdefault(call["from"], []).append((call["to"], call["url"]))
+
+        if key == "folders":
+            with open("../tools/cicd_folders.txt") as cicd:
+                cifolders = cicd.readlines()
+                cifolders = [line.rstrip() for line in cifolders]
+
+                for ci in cifolders:
+                    if ci in value:
+                        self.vars["hasCiCdFolders"] = True
+                        break
 
-        for service in self._metamodel["system"]["microservices"]:
-            self.vars["totalLocs"] = self.vars["totalLocs"] + int(service["locs"])
-            self.vars["totalFiles"] = self.vars["totalFiles"] + int(service["nb_files"])
 
-        self.vars["avgLocs"] = self.vars.setdefault("avgLocs", 0) + (self.vars["totalLocs"] / self.vars["nbServices"])
-        self.vars["avgFiles"] = self.vars.setdefault("avgFiles", 0) + (self.vars["totalFiles"] / self.vars["nbServices"])
+    def visitService(self, service):
+        name = service["name"]
+        self._order[name] = len(self._order)
+        self.vars["nbServices"] += 1
+        self.vars["totalLocs"] += int(service["locs"])
+        self.vars["totalFiles"] += int(service["nb_files"])
+        if "sizes" in self._inputs:
+            self._sizes.append((name, service["locs"], service["nb_files"]))
+            if service.get("sample"):
+                self._locsRanges[name] = (service["sample"]["locs"]["low"], service["sample"]["locs"]["high"])
+        if "languages" in self._inputs:
+            self._languages[name] = service["language"]
+
+        if "dependencyIndex" in self._inputs:
+            self._deps[name] = tuple(sys.intern(d) for d in service["dependencies"])
+            for dependency in dict.fromkeys(self._deps[name]):
+                self._depIndex.setdefault(dependency, []).append(name)
+
+        if "datasourceIndex" in self._inputs:
+            datasources = service["code"]["databases"]["datasources"]
+            self._datasources[name] = tuple(sys.intern(d) for d in datasources)
+            for datasource in dict.fromkeys(self._datasources[name]):
+                self._datasourceIndex.setdefault(datasource, []).append(name)
+
+        if "importGraph" in self._inputs:
+            if "folders" in self._system:
+                imports = "\n".join(service["code"]["imports"])
+                self._importedNames[name] = set(f for f in self._system["folders"] if f in imports)
+            else:
+                self._imports[name] = service["code"]["imports"]
+
+        if "dockerFiles" in self._inputs and len(service["deployment"]["docker_files"]) == 0:
+            self._noDockerFile.append(name)
+
+        for rule in self._serviceRules:
+            rule(service)
 
-        self.vars["hasCiCdFolders"] = self.vars.setdefault("hasCiCdFolders", False)
-        
-        with open("../tools/cicd_folders.txt") as cicd:
-            cifolders = cicd.readlines()
-            cifolders = [line.rstrip() for line in cifolders]
 
-            for ci in cifolders:
-                if ci in self._metamodel["system"]["folders"]:
-                    self.vars["hasCiCdFolders"] = True
-                    break
+    def buildVars(self):
+        nbServices = max(self.vars["nbServices"], 1)
+        self.vars["avgLocs"] = self.vars["totalLocs"] / nbServices
+        self.vars["avgFiles"] = self.vars["totalFiles"] / nbServices
 
 
     # Rule : (LOC < (threshold * SysAvgLocs) and NbFiles < (threshold * SysAvgNbFiles))
     def hasNanoService(self):
-        for service in self._metamodel["system"]["microservices"]:
+        for name, locs, nbFiles in self._sizes:
             requiredLocs = math.floor(self.NANO_SERVICE_LOC_THRESHOLD * self.vars["avgLocs"])
             requiredFiles = math.floor(self.NANO_SERVICE_FILES_THRESHOLD * self.vars["avgFiles"])
 
-            hasLessLocsThanAvg = int(service["locs"]) < requiredLocs
-            hasLessFilesThanAvg = int(service["nb_files"]) < requiredFiles
+            hasLessLocsThanAvg = int(locs) < requiredLocs
+            hasLessFilesThanAvg = int(nbFiles) < requiredFiles
 
             if(hasLessLocsThanAvg and hasLessFilesThanAvg):
-                self._hasNano[service["name"]] = {
-                    "locs": service["locs"], 
-                    "nbFiles": service["nb_files"], 
-                    "requiredLocs": requiredLocs, 
+                self._hasNano[name] = {
+                    "locs": locs,
+                    "nbFiles": nbFiles,
+                    "requiredLocs": requiredLocs,
                     "requiredFiles": requiredFiles
                 }
 
 
     # Rule : (LOC > (threshold * SysAvgLocs) and NbFiles > (threshold * SysAvgNbFiles))
     def hasMegaService(self):
-        for service in self._metamodel["system"]["microservices"]:
+        for name, locs, nbFiles in self._sizes:
             requiredLocs = math.floor(self.MEGA_SERVICE_LOC_THRESHOLD * self.vars["avgLocs"])
             requiredFiles = math.floor(self.MEGA_SERVICE_FILES_THRESHOLD * self.vars["avgFiles"])
 
-            hasMoreLocsThanAvg = int(service["locs"]) > requiredLocs
-            hasMoreFilesThanAvg = int(service["nb_files"]) > requiredFiles
+            hasMoreLocsThanAvg = int(locs) > requiredLocs
+            hasMoreFilesThanAvg = int(nbFiles) > requiredFiles
 
             if(hasMoreLocsThanAvg and hasMoreFilesThanAvg):
-                self._hasMega[service["name"]] = {
-                    "locs": service["locs"], 
-                    "nbFiles": service["nb_files"], 
-                    "requiredLocs": requiredLocs, 
+                self._hasMega[name] = {
+                    "locs": locs,
+                    "nbFiles": nbFiles,
+                    "requiredLocs": requiredLocs,
                     "requiredFiles": requiredFiles
                 }
 
     # Rule : intersect(Service discovery, dependencies) = 0 AND (count(URLs, source code) > 1 OR count(URLs, config files) > 1)
-    def hasHardcodedEndpoints(self):
-        with open("../tools/service_discovery.txt", "r") as sdTools:
-            tools = sdTools.readlines()
-            tools = [line.rstrip() for line in tools]
-            res = []
-            sysres = []
-            
-            # Microservice level
-            for service in self._metamodel["system"]["microservices"]:
-                for dependency in service["dependencies"]:                
-                    for tool in tools:
-                        if (tool in dependency):
-                            res.append(tool)
-            
-                if (len(service["code"]["http"]) > 0):
-                    self._hasHardcodedEndpoints[service["name"]] = {
-                        "hasServiceDiscoveryTool": len(res) != 0,
-                        "FoundUrls": ", ".join(service["code"]["http"])
-                    }
-            
-            # System level
-            for dependency in self._metamodel["system"]["dependencies"]:
-                for tool in tools:
-                    if (tool in dependency):
-                        sysres.append(tool)
-            
-                if (len(self._metamodel["system"]["http"]) > 0):
-                    self._hasHardcodedEndpoints["system"] = {
-                        "hasServiceDiscoveryTool": len(sysres) != 0,
-                        "FoundUrls": ", ".join(self._metamodel["system"]["http"])
-                    }
+    def hasHardcodedEndpoints(self, service):
+        res = self.matchTools("hardcodedEndpoints", "service_discovery", service["dependencies"])
+
+        if (len(service["code"]["http"]) > 0):
+            self._hasHardcodedEndpoints[service["name"]] = {
+                "hasServiceDiscoveryTool": len(res) != 0,
+                "FoundUrls": ", ".join(service["code"]["http"]),
+                "CalledServices": self._calls.get(service["name"], [])
+            }
+
+    def hasSystemHardcodedEndpoints(self):
+        tools = self.loadTools("service_discovery")
+        sysres = []
+        for dependency in self._system["dependencies"]:
+            for tool in tools:
+                if (tool in dependency):
+                    sysres.append(tool)
+
+            if (len(self._system["http"]) > 0):
+                self._hasHardcodedEndpoints["system"] = {
+                    "hasServiceDiscoveryTool": len(sysres) != 0,
+                    "FoundUrls": ", ".join(self._system["http"])
+                }
 
 
     # Rule : intersect(Config management, dependencies) = 0 AND count(configuration files, service) > 0
-    def hasManualConfiguration(self):
-        with open("../tools/configuration.txt", "r") as confTools:
-            tools = confTools.readlines()
-            tools = [line.rstrip() for line in tools]
-            res = []
-            sysres = []
-            
-            # Microservice level
-            for service in self._metamodel["system"]["microservices"]:
-                for dependency in service["dependencies"]:                
-                    for tool in tools:
-                        if (tool in dependency):
-                            res.append(tool)
-            
-                if (len(service["config"]["config_files"]) > 0):
-                    self._hasManualConfig[service["name"]] = {
-                        "hasConfigurationTool": len(res) != 0,
-                        "FoundConfigFiles": ", ".join(service["config"]["config_files"])
-                    }
-            
-            # System level
-            for dependency in self._metamodel["system"]["dependencies"]:
-                for tool in tools:
-                    if (tool in dependency):
-                        sysres.append(tool)
-            
-                if (len(self._metamodel["system"]["config_files"]) > 0):
-                    self._hasManualConfig["system"] = {
-                        "hasConfigurationTool": len(sysres) != 0,
-                        "FoundConfigFiles": ", ".join(self._metamodel["system"]["config_files"])
-                    }  
-
-            
+    def hasManualConfiguration(self, service):
+        res = self.matchTools("manualConfiguration", "configuration", service["dependencies"])
+
+        if (len(service["config"]["config_files"]) > 0):
+            self._hasManualConfig[service["name"]] = {
+                "hasConfigurationTool": len(res) != 0,
+                "FoundConfigFiles": ", ".join(service["config"]["config_files"])
+            }
+
+    def hasSystemManualConfiguration(self):
+        tools = self.loadTools("configuration")
+        sysres = []
+        for dependency in self._system["dependencies"]:
+            for tool in tools:
+                if (tool in dependency):
+                    sysres.append(tool)
+
+            if (len(self._system["config_files"]) > 0):
+                self._hasManualConfig["system"] = {
+                    "hasConfigurationTool": len(sysres) != 0,
+                    "FoundConfigFiles": ", ".join(self._system["config_files"])
+                }
+
+
     # Rule : intersect(API Gateways, dependencies) = 0
-    def hasApiGateway(self):
-        with open("../tools/gateway.txt", "r") as sdTools:
-            tools = sdTools.readlines()
-            tools = [line.rstrip() for line in tools]
-            res = []
-            sysres = []
-            
-            # Microservice level
-            for service in self._metamodel["system"]["microservices"]:
-                for dependency in service["dependencies"]:                
-                    for tool in tools:
-                        if (tool in dependency):
-                            res.append(tool)
-            
-                if (len(res) == 0):
-                    self._hasNoApiGateway[service["name"]] = {
-                        "hasApiGatewayTool": False
-                    }
-            
-            # System level
-            for dependency in self._metamodel["system"]["dependencies"]:
-                for tool in tools:
-                    if (tool in dependency):
-                        sysres.append(tool)
-            
-                if (len(sysres) == 0):
-                    self._hasNoApiGateway["system"] = {
-                        "hasApiGatewayTool": False
-                    }
+    def hasApiGateway(self, service):
+        res = self.matchTools("apiGateway", "gateway", service["dependencies"])
+
+        if (len(res) == 0):
+            self._hasNoApiGateway[service["name"]] = {
+                "hasApiGatewayTool": False
+            }
+
+    def hasSystemApiGateway(self):
+        tools = self.loadTools("gateway")
+        sysres = []
+        for dependency in self._system["dependencies"]:
+            for tool in tools:
+                if (tool in dependency):
+                    sysres.append(tool)
+
+            if (len(sysres) == 0):
+                self._hasNoApiGateway["system"] = {
+                    "hasApiGatewayTool": False
+                }
 
 
 
     # Rule : intersect(distributed logging tool, dependencies) = 0
-    def hasLocalLogging(self):
-        with open("../tools/logging.txt", "r") as sdTools:
-            tools = sdTools.readlines()
-            tools = [line.rstrip() for line in tools]
-            res = []
-            sysres = []
-            
-            # Microservice level
-            for service in self._metamodel["system"]["microservices"]:
-                for dependency in service["dependencies"]:                
-                    for tool in tools:
-                        if (tool in dependency):
-                            res.append(tool)
-            
-                if (len(res) == 0):
-                    self._hasLocalLogging[service["name"]] = {
-                        "hasLoggingTool": False
-                    }
-            
-            # System level
-            for dependency in self._metamodel["system"]["dependencies"]:
-                for tool in tools:
-                    if (tool in dependency):
-                        sysres.append(tool)
-            
-                if (len(sysres) == 0):
-                    self._hasLocalLogging["system"] = {
-                        "hasLoggingTool": False
-                    }
+    def hasLocalLogging(self, service):
+        res = self.matchTools("localLogging", "logging", service["dependencies"])
+
+        if (len(res) == 0):
+            self._hasLocalLogging[service["name"]] = {
+                "hasLoggingTool": False
+            }
+
+    def hasSystemLocalLogging(self):
+        tools = self.loadTools("logging")
+        sysres = []
+        for dependency in self._system["dependencies"]:
+            for tool in tools:
+                if (tool in dependency):
+                    sysres.append(tool)
+
+            if (len(sysres) == 0):
+                self._hasLocalLogging["system"] = {
+                    "hasLoggingTool": False
+                }
 
 
 
     # Rule : intersect(monitoring libs, dependencies) = 0
-    def hasInsufficientMonitoring(self):
-        with open("../tools/monitoring.txt", "r") as sdTools:
-            tools = sdTools.readlines()
-            tools = [line.rstrip() for line in tools]
-            res = []
-            sysres = []
-            
-            # Microservice level
-            for service in self._metamodel["system"]["microservices"]:
-                for dependency in service["dependencies"]:                
-                    for tool in tools:
-                        if (tool in dependency):
-                            res.append(tool)
-            
-                if (len(res) == 0):
-                    self._hasInsufficientMonitoring[service["name"]] = {
-                        "hasMonitoringTools": False
-                    }
-            
-            # System level
-            for dependency in self._metamodel["system"]["dependencies"]:
-                for tool in tools:
-                    if (tool in dependency):
-                        sysres.append(tool)
-            
-                if (len(sysres) == 0):
-                    self._hasInsufficientMonitoring["system"] = {
-                        "hasMonitoringTools": False
-                    }
+    def hasInsufficientMonitoring(self, service):
+        res = self.matchTools("insufficientMonitoring", "monitoring", service["dependencies"])
+
+        if (len(res) == 0):
+            self._hasInsufficientMonitoring[service["name"]] = {
+                "hasMonitoringTools": False
+            }
+
+    def hasSystemInsufficientMonitoring(self):
+        tools = self.loadTools("monitoring")
+        sysres = []
+        for dependency in self._system["dependencies"]:
+            for tool in tools:
+                if (tool in dependency):
+                    sysres.append(tool)
+
+            if (len(sysres) == 0):
+                self._hasInsufficientMonitoring["system"] = {
+                    "hasMonitoringTools": False
+                }
 
 
 
     # Rule : intersect(docker-compose.yml, system) = 0 AND intesect(DOCKERFILE, microservices) = 0
     def hasMultipleServicesPerHost(self):
         systemHasCompose = False
-        for file in self._metamodel["system"]["config_files"]:
-            if "docker-compose.yml" in file:
+        composeFiles = self.descriptorFiles(self._system.get("descriptors"), kind="compose")
+        if composeFiles is None:
+            composeFiles = [f for f in self._system["config_files"] if "docker-compose.yml" in f]
+        for file in self._system["config_files"]:
+            if file in composeFiles:
                 systemHasCompose = True
 
             # Microservice level
-            for service in self._metamodel["system"]["microservices"]:
-                if len(service["deployment"]["docker_files"]) == 0:
+            for name in self._noDockerFile:
+                self._hasMultipleInstancesPerHost[name] = {
+                    "hasDockerFile": False
+                }
 
-                    self._hasMultipleInstancesPerHost[service["name"]] = {
-                        "hasDockerFile": False
-                    }
-            
             self._hasMultipleInstancesPerHost["system"] = {
                 "systemHasCompose": systemHasCompose
             }
 
     # Rule : intersect(CI tools, dependencies) = 0 AND intersect(CI folders, system) = 0
-    def hasCiCd(self):
-        with open("../tools/cicd.txt", "r") as sdTools:
-            tools = sdTools.readlines()
-            tools = [line.rstrip() for line in tools]
-            res = []
-            
-            # Microservice level
-            for service in self._metamodel["system"]["microservices"]:
-                for dependency in service["dependencies"]:                
-                    for tool in tools:
-                        if (tool in dependency):
-                            res.append(tool)
-            
-                if (len(res) == 0):
-                    self._hasNoCiCd[service["name"]] = {
-                        "hasCiCdTools": False
-                    }
+    def hasCiCd(self, service):
+        res = self.matchTools("ciCd", "cicd", service["dependencies"])
+
+        if (len(res) == 0):
+            self._hasNoCiCd[service["name"]] = {
+                "hasCiCdTools": False
+            }
 
 
     # intersect(healthcheck libs, system) = 0 OR (count(healthcheck, annotations) < 1 AND count(healthcheck, imports) < 1)
-    def hasHealthCheck(self):
-        with open("../tools/healthcheck.txt", "r") as sdTools:
-            tools = sdTools.readlines()
-            tools = [line.rstrip() for line in tools]
-            res = []
-            sysres = []
-            
-            # Microservice level
-            for service in self._metamodel["system"]["microservices"]:
-                hasHealthImports = False
-                hasHealthAnnotation = False
-                for dependency in service["dependencies"]:                
-                    for tool in tools:
-                        if (tool in dependency):
-                            res.append(tool)
-                for imp in service["code"]["imports"]:
-                    if "health" in imp.lower():
-                        hasHealthImports = True
-                        break
+    def hasHealthCheck(self, service):
+        hasHealthImports = False
+        hasHealthAnnotation = False
+        res = self.matchTools("healthCheck", "healthcheck", service["dependencies"])
+        for imp in service["code"]["imports"]:
+            if "health" in imp.lower():
+                hasHealthImports = True
+                break
+
+        for ann in service["code"]["annotations"]:
+            if "health" in ann.lower():
+                hasHealthAnnotation = True
+                break
+
+
+        if (len(res) == 0):
+            self._hasNoHealthCheck[service["name"]] = {
+                "hasHealthcheckTools": False,
+                "hasHealthImports": hasHealthImports,
+                "hasHealthAnnotations": hasHealthAnnotation
+            }
 
-                for ann in service["code"]["annotations"]:
-                    if "health" in ann.lower():
-                        hasHealthAnnotation = True
-                        break
-                                
-            
-                if (len(res) == 0):
-                    self._hasNoHealthCheck[service["name"]] = {
-                        "hasHealthcheckTools": False,
-                        "hasHealthImports": hasHealthImports,
-                        "hasHealthAnnotations": hasHealthAnnotation
-                    }
-            
-            # System level
-            for dependency in self._metamodel["system"]["dependencies"]:
-                for tool in tools:
-                    if (tool in dependency):
-                        sysres.append(tool)
-            
-                if (len(sysres) == 0):
-                    self._hasNoHealthCheck["system"] = {
-                        "hasHealthcheckTools": False
-                    }
+    def hasSystemHealthCheck(self):
+        tools = self.loadTools("healthcheck")
+        sysres = []
+        for dependency in self._system["dependencies"]:
+            for tool in tools:
+                if (tool in dependency):
+                    sysres.append(tool)
+
+            if (len(sysres) == 0):
+                self._hasNoHealthCheck["system"] = {
+                    "hasHealthcheckTools": False
+                }
+
+
+    # Import graph : MSa -> MSb when the name of MSb appears in the imports of MSa.
+    # Built once, shared by the wrong cuts and circular dependencies rules.
+    def importGraph(self):
+        names = list(self._order)
+        graph = dict()
+        for name in names:
+            if name in self._importedNames:
+                imported = self._importedNames[name]
+            else:
+                imports = "\n".join(self._imports[name])
+                imported = set(n for n in names if n in imports)
+            graph[name] = [n for n in names if n in imported and n != name]
+        return graph
 
 
 	# Rule: (MSa-lng in Programming) AND (MSb-lng NOT IN Programming) AND MSa imports MSb
     def hasWrongCuts(self):
-        names = [s["name"] for s in self._metamodel["system"]["microservices"]]
-        for service in self._metamodel["system"]["microservices"]:
-            self._hasWrongCuts[service["name"]] = []
-            for name in names:
-                for imp in service["code"]["imports"]:
-                    if name in imp and name != service["name"]:
+        languages = None
+        for name, imported in self._graph.items():
+            self._hasWrongCuts[name] = []
+            for other in imported:
+                if languages is None:
+                    languages = []
+                    if os.path.exists("../tools/programming.txt"):
                         with open("../tools/programming.txt") as prog:
-                            languages = prog.readlines()
-                            languages = [l.rsplit() for l in languages]
+                            languages = [l.rstrip() for l in prog.readlines()]
 
-                            if service["language"] in languages and service[name]["language"] not in languages:
-                                self._hasWrongCuts[service].append({
-                                    "from": service["name"],
-                                    "to": name
-                                })
+                if self._languages[name] in languages and self._languages[other] not in languages:
+                    self._hasWrongCuts[name].append({
+                        "from": name,
+                        "to": other
+                    })
 
 
 	# Rule: Msa imports MSb AND MSb imports MSa
     def hasCircularDependencies(self):
-        names = [s["name"] for s in self._metamodel["system"]["microservices"]]
-        for service in self._metamodel["system"]["microservices"]:
-            self._hasCircularDeps[service["name"]] = []
-            for name in names:
-                for imp in service["code"]["imports"]:
-                    if name in imp and name != service["name"]:
-                        for imp2 in self._metamodel["microservices"][name]["code"]["imports"]:
-                            if service["name"] in imp2:
-                                    self._hasCircularDeps[service].append({
-                                        "from": service["name"],
-                                        "to": name
-                                    })
+        for name, imported in self._graph.items():
+            self._hasCircularDeps[name] = []
+            for other in imported:
+                if name in self._graph[other]:
+                    self._hasCircularDeps[name].append({
+                        "from": name,
+                        "to": other
+                    })
+
+
+    # Pairs of services sharing values, through the value -> services index
+    def sharedValues(self, values, index):
+        shared = dict()
+        for name, own in values.items():
+            overlaps = dict()
+            for val in own:
+                for other in index[val]:
+                    if other != name:
+                        overlaps.setdefault(other, []).append(val)
+            shared[name] = sorted(overlaps.items(), key=lambda item: self._order[item[0]])
+        return shared
 
 
 	# Rule: MSa uses depX AND MSb uses depX
     def hasSharedDependencies(self):
-        for i in range(len(self._metamodel["system"]["microservices"])):
-            name = self._metamodel["system"]["microservices"][i]["name"]
+        for name, overlaps in self.sharedValues(self._deps, self._depIndex).items():
             self._hasSharedLibs[name] = []
-            deps = self._metamodel["system"]["microservices"][i]["dependencies"]
-            for service in self._metamodel["system"]["microservices"]:
-                if service["name"] == name:
-                    continue
-                deps2 = service["dependencies"]
-
-                overlap = [val for val in deps if val in deps2]
-                
-                if (len(overlap) != 0):
-                    self._hasSharedLibs[name].append({
-                        "from": name,
-                        "to": service["name"],
-                        "shared": overlap
-                    })
+            for other, overlap in overlaps:
+                self._hasSharedLibs[name].append({
+                    "from": name,
+                    "to": other,
+                    "shared": overlap
+                })
 
 
 
-    # Rule(intersect(Circuit breakers, dependencies) = 0 
+    # Rule(intersect(Circuit breakers, dependencies) = 0
     # AND intersect(Fallbacks, methods) = 0) OR (count(timeouts, imports) > 1 OR count(timeouts, methods) > 1)
-    def hasTimeouts(self):
-        with open("../tools/circuit_breaker.txt", "r") as sdTools:
-            tools = sdTools.readlines()
-            tools = [line.rstrip() for line in tools]
-            res = []
-            sysres = []
-            
-            # Microservice level
-            for service in self._metamodel["system"]["microservices"]:
-                hasTOImports = False
-                hasTOMethods = False
-                hasFBMethods = False
-                for dependency in service["dependencies"]:                
-                    for tool in tools:
-                        if (tool in dependency):
-                            res.append(tool)
-                for imp in service["code"]["imports"]:
-                    if "timeout" in imp.lower():
-                        hasTOImports = True
-                        break
+    def hasTimeouts(self, service):
+        hasTOImports = False
+        hasTOMethods = False
+        hasFBMethods = False
+        res = self.matchTools("timeouts", "circuit_breaker", service["dependencies"])
+        for imp in service["code"]["imports"]:
+            if "timeout" in imp.lower():
+                hasTOImports = True
+                break
+
+        for meth in service["code"]["methods"]:
+            if "timeout" in meth.lower():
+                hasTOMethods = True
+            if "fallback" in meth.lower():
+                hasFBMethods = True
+
+            if hasTOMethods or hasFBMethods:
+                break
+
+
+        if ((len(res) == 0 and hasFBMethods) or (hasTOImports or hasTOMethods)):
+            self._hasTimeouts[service["name"]] = {
+                "hasCircuitBreakerTool": False,
+                "hasTOMethods": hasTOMethods,
+                "hasTOImports": hasTOImports,
+                "hasFBMethods": hasFBMethods
+            }
 
-                for meth in service["code"]["methods"]:
-                    if "timeout" in meth.lower():
-                        hasTOMethods = True
-                    if "fallback" in meth.lower():
-                        hasFBMethods = True
-                    
-                    if hasTOMethods or hasFBMethods:
-                        break
-                                
-            
-                if ((len(res) == 0 and hasFBMethods) or (hasTOImports or hasTOMethods)):
-                    self._hasTimeouts[service["name"]] = {
-                        "hasCircuitBreakerTool": False,
-                        "hasTOMethods": hasTOMethods,
-                        "hasTOImports": hasTOImports,
-                        "hasFBMethods": hasFBMethods
-                    }
-            
-            # System level
-            for dependency in self._metamodel["system"]["dependencies"]:
-                for tool in tools:
-                    if (tool in dependency):
-                        sysres.append(tool)
-            
-                self._hasTimeouts["system"] = {
-                    "hasCircuitBreaker": len(sysres) != 0
-                }
+    def hasSystemTimeouts(self):
+        tools = self.loadTools("circuit_breaker")
+        sysres = []
+        for dependency in self._system["dependencies"]:
+            for tool in tools:
+                if (tool in dependency):
+                    sysres.append(tool)
+
+            self._hasTimeouts["system"] = {
+                "hasCircuitBreaker": len(sysres) != 0
+            }
 
 
     def hasSharedPersistence(self):
-        for i in range(len(self._metamodel["system"]["microservices"])):
-            name = self._metamodel["system"]["microservices"][i]["name"]
+        for name, overlaps in self.sharedValues(self._datasources, self._datasourceIndex).items():
             self._hasSharedPersistence[name] = []
-            dbs = self._metamodel["system"]["microservices"][i]["code"]["databases"]["datasources"]
-            for service in self._metamodel["system"]["microservices"]:
-                if service["name"] == name:
-                    continue
-                dbs2 = service["code"]["databases"]["datasources"]
-
-                overlap = [val for val in dbs if val in dbs2]
-                
-                if (len(overlap) != 0):
-                    self._hasSharedPersistence[name].append({
-                        "from": name,
-                        "to": service["name"],
-                        "shared": overlap
-                    })
+            for other, overlap in overlaps:
+                self._hasSharedPersistence[name].append({
+                    "from": name,
+                    "to": other,
+                    "shared": overlap
+                })
+
+    # Files holding deployment descriptors (of the given kind, or with an
+    # apiVersion), None for metamodels extracted without descriptors : the
+    # rules then read the files
+    def descriptorFiles(self, descriptors, kind=None):
+        if descriptors is None:
+            return None
+        if kind is not None:
+            return set(d["file"] for d in descriptors if d["kind"] == kind)
+        return set(d["file"] for d in descriptors if d["apiVersion"])
+
+    # Files holding a versioned descriptor are not read again, any other file
+    # (no kind, not YAML...) is searched for apiVersion
+    def hasApiVersion(self, conf_file, versioned):
+        if versioned is not None and conf_file in versioned:
+            return True
+        return "apiVersion" in sources.readtext(conf_file)
 
     # Rule : count("apiVersion", config) < 1
-    def hasNoApiVersioning(self):
+    def hasNoApiVersioning(self, service):
+        versioned = self.descriptorFiles(service["deployment"].get("descriptors"))
+        for conf_file in service["config"]["config_files"]:
+            if not self.hasApiVersion(conf_file, versioned):
+                self._hasNoApiVersioning[service["name"]] = {
+                    "hasApiVersioning": False
+                }
+
+    def hasSystemApiVersioning(self):
         sysres = False
-        for service in self._metamodel["system"]["microservices"]:
-            for conf_file in service["config"]["config_files"]:
-                with open(conf_file) as conf:
-                    if "apiVersion" not in conf.read():
-                        self._hasNoApiVersioning[service["name"]] = {
-                            "hasApiVersioning": False
-                        }
-
-        for conf_file in self._metamodel["system"]["config_files"]:
-            with open(conf_file) as conf:
-                if "apiVersion" in conf.read():
-                    sysres = True
-                    break
+        versioned = self.descriptorFiles(self._system.get("descriptors"))
+        for conf_file in self._system["config_files"]:
+            if self.hasApiVersion(conf_file, versioned):
+                sysres = True
+                break
 
         self._hasNoApiVersioning["system"] = {
             "hasApiVersioning": sysres
-        }                 
-
-    def getResults(self):
-
-        self.hasNanoService()
-        self.hasMegaService()
-        self.hasHardcodedEndpoints()
-        self.hasManualConfiguration()
-        self.hasApiGateway()
-        self.hasLocalLogging()
-        self.hasInsufficientMonitoring()
-        self.hasCiCd()
-        self.hasMultipleServicesPerHost()
-        self.hasHealthCheck()
-        self.hasWrongCuts()
-        self.hasCircularDependencies()
-        self.hasSharedDependencies()
-        self.hasTimeouts()
-        self.hasSharedPersistence()
-        self.hasNoApiVersioning()
+        }
+
+    # Shared indexes are built once, then the selected system rules run in
+    # report order
+    def finish(self):
+        self.buildVars()
+        if "importGraph" in self._inputs:
+            self._graph = self.importGraph()
+        for rule in self.rules:
+            for catalog in self.RULES[rule].get("catalogs", []):
+                self.loadTools(catalog)
+
+        for rule in self.rules:
+            if "system" in self.RULES[rule]:
+                getattr(self, self.RULES[rule]["system"])()
+
+    # Runs every rule over (key, value) pairs as yielded by metamodel.stream,
+    # or over the in-memory metamodel given to the constructor
+    def getResults(self, stream=None):
+        if stream is None:
+            stream = []
+            for key, value in self._metamodel["system"].items():
+                if key == "microservices":
+                    stream += [(key, service) for service in value]
+                else:
+                    stream.append((key, value))
+
+        for key, value in stream:
+            if key == "microservices":
+                self.visitService(value)
+            else:
+                self.visitSystem(key, value)
+        self.finish()
+
+    # Services (or pairs of services) found by every rule, in the order
+    # printResults lists them
+    def getFindings(self):
+        def pairs(found):
+            seen = []
+            for v in found.values():
+                for pair in v:
+                    if [pair["to"], pair["from"]] not in seen and [pair["from"], pair["to"]] not in seen:
+                        seen.append([pair["from"], pair["to"]])
+            return seen
+
+        findings = {
+            "nanoServices": list(self._hasNano),
+            "megaServices": list(self._hasMega),
+            "hardcodedEndpoints": list(self._hasHardcodedEndpoints),
+            "manualConfiguration": list(self._hasManualConfig),
+            "noApiGateway": list(self._hasNoApiGateway),
+            "localLogging": list(self._hasLocalLogging),
+            "insufficientMonitoring": list(self._hasInsufficientMonitoring),
+            "noCiCd": list(self._hasNoCiCd),
+            "multipleInstancesPerHost": [k for k in self._hasMultipleInstancesPerHost if k != "system"],
+            "noHealthCheck": list(self._hasNoHealthCheck),
+            "timeouts": [k for k in self._hasTimeouts if k != "system"],
+            "sharedPersistence": pairs(self._hasSharedPersistence),
+            "wrongCuts": pairs(self._hasWrongCuts),
+            "circularDependencies": pairs(self._hasCircularDeps),
+            "sharedDependencies": pairs(self._hasSharedLibs),
+            "noApiVersioning": [k for k in self._hasNoApiVersioning if k != "system"]
+        }
+        return dict((rule, findings[rule]) for rule in self.rules)
 
     def printResults(self):
         print("\n")
@@ -533,31 +715,53 @@ class Detector(object):
         print("====================================================================")
         print("\n")
 
+        sample = self._system.get("sample")
+        estimated = "~" if sample else ""
         print("System information : ")
         print("=====================")
         print("Number of microservices : {nb}".format(nb=self.vars["nbServices"]))
-        print("Total lines of code : {nb}".format(nb=self.vars["totalLocs"]))
+        print("Total lines of code : {approx}{nb}".format(approx=estimated, nb=self.vars["totalLocs"]))
         print("Total number of files : {nb}".format(nb=self.vars["totalFiles"]))
-        print("Avg LOCs per service : {nb}".format(nb=math.floor(self.vars["avgLocs"])))
+        print("Avg LOCs per service : {approx}{nb}".format(approx=estimated, nb=math.floor(self.vars["avgLocs"])))
         print("Avg Files per service : {nb}".format(nb=math.floor(self.vars["avgFiles"])))
         print("\n")
 
+        if sample:
+            approximate = [rule for rule in self.rules if set(self.RULES[rule]["facts"]) & set(self.SAMPLED_FACTS)]
+            print("APPROXIMATE RESULTS : ")
+            print("=====================")
+            print("{pct:g}% of the source files of every service were parsed, lines of code are estimates"
+                  " ({conf:g}% confidence bounds)".format(pct=sample["fraction"] * 100, conf=sample["confidence"] * 100))
+            print("Rules on sampled facts : " + (", ".join(approximate) or "none"))
+            print("\n")
+
         print("Detection summary : ")
         print("===========================")
         print("\n")
+        for rule in self.rules:
+            getattr(self, self.RULES[rule]["print"])()
+
+    # ~1500 (1380-1620) for an estimate
+    def formatLocs(self, name, locs):
+        if name not in self._locsRanges:
+            return str(locs)
+        return "~{locs} ({low}-{high})".format(locs=locs, low=self._locsRanges[name][0], high=self._locsRanges[name][1])
+
+    def printNanoServices(self):
         print("Nano services : ")
         print("----------------")
         for k, v in self._hasNano.items():
-            print("- " + k + ": {locs} Locs, {files} Files.".format(locs=v["locs"], files=v["nbFiles"]))
+            print("- " + k + ": {locs} Locs, {files} Files.".format(locs=self.formatLocs(k, v["locs"]), files=v["nbFiles"]))
         print("\n")
 
+    def printMegaServices(self):
         print("Mega services : ")
         print("----------------")
         for k, v in self._hasMega.items():
-            print("- " + k + ": {locs} Locs, {files} Files.".format(locs=v["locs"], files=v["nbFiles"]))
+            print("- " + k + ": {locs} Locs, {files} Files.".format(locs=self.formatLocs(k, v["locs"]), files=v["nbFiles"]))
         print("\n")    
 
-
+    def printHardcodedEndpoints(self):
         print("Hardcoded Endpoints : ")
         print("----------------------")
         for k, v in self._hasHardcodedEndpoints.items():
@@ -566,9 +770,13 @@ class Detector(object):
             print("\t- Found URLs in microservice :")
             for url in v["FoundUrls"].split(","):
                 print("\t\t- " + url.strip())
+            if v.get("CalledServices"):
+                print("\t- Calls to other microservices :")
+                for called, url in v["CalledServices"]:
+                    print("\t\t- " + called + " (" + url + ")")
         print("\n")  
 
-
+    def printManualConfiguration(self):
         print("Manual configuration : ")
         print("-----------------------")
         for k, v in self._hasManualConfig.items():
@@ -579,24 +787,28 @@ class Detector(object):
                 print("\t\t- " + url.strip().split("/")[-1])
         print("\n")  
 
+    def printNoApiGateway(self):
         print("No API Gateway : ")
         print("-----------------")
         for k, v in self._hasNoApiGateway.items():
             print("- " + k + " has no API Gateway tools")
         print("\n") 
 
+    def printLocalLogging(self):
         print("Local logging : ")
         print("----------------")
         for k, v in self._hasLocalLogging.items():
             print("- " + k + " has no logging tools")
         print("\n") 
 
+    def printInsufficientMonitoring(self):
         print("Insufficient monitoring : ")
         print("--------------------------")
         for k, v in self._hasInsufficientMonitoring.items():
             print("- " + k + " has no monitoring tools")
         print("\n") 
 
+    def printNoCiCd(self):
         print("No CI/CD : ")
         print("-----------")
         if(self.vars["hasCiCdFolders"]):
@@ -605,7 +817,8 @@ class Detector(object):
         for k, v in self._hasNoCiCd.items():
             print("- " + k + " has no CI/CD information")
         print("\n") 
-    
+
+    def printMultipleInstancesPerHost(self):
         print("Multiple instances per host : ")
         print("--------------------------")
         if(self._hasMultipleInstancesPerHost["system"]["systemHasCompose"]):
@@ -614,8 +827,8 @@ class Detector(object):
         for k, v in self._hasMultipleInstancesPerHost.items():
             print("- " + k + " has no DockerFile")
         print("\n") 
-        
 
+    def printNoHealthCheck(self):
         print("No HealthCheck : ")
         print("-----------------")
         print("*** If you only see system on this list, you're most likely fine.***")
@@ -623,6 +836,7 @@ class Detector(object):
             print("- " + k + " has no healthcheck library")
         print("\n")  
 
+    def printTimeouts(self):
         print("Timeouts : ")
         print("-----------------")
         for k, v in self._hasTimeouts.items():
@@ -634,6 +848,7 @@ class Detector(object):
                 print("\t- Has Fallback methods : " + str(v["hasFBMethods"]))
         print("\n")         
 
+    def printSharedPersistence(self):
         print("Shared Databases : ")
         print("-----------------")
         seen = []
@@ -646,8 +861,8 @@ class Detector(object):
                     seen.append((pair["from"],pair["to"]))
                     seen.append((pair["to"],pair["from"]))
         print("\n")              
-         
 
+    def printWrongCuts(self):
         print("Wrong cuts : ")
         print("-------------")
         seenWc = []
@@ -659,6 +874,7 @@ class Detector(object):
                     seenWc.append((pair["to"],pair["from"]))
         print("\n")     
 
+    def printCircularDependencies(self):
         print("Circular Dependencies : ")
         print("------------------------")
         seenCD = []
@@ -669,9 +885,8 @@ class Detector(object):
                     seenCD.append((pair["from"],pair["to"]))
                     seenCD.append((pair["to"],pair["from"]))
         print("\n")              
-       
-
 
+    def printSharedDependencies(self):
         print("Shared Dependencies : ")
         print("----------------------")
         seen = []
@@ -685,7 +900,7 @@ class Detector(object):
                     seen.append((pair["to"],pair["from"]))
         print("\n")     
 
-
+    def printNoApiVersioning(self):
         print("No API Versioning : ")
         print("-----------------")
         if (self._hasNoApiVersioning["system"]["hasApiVersioning"] == True):
@@ -695,18 +910,30 @@ class Detector(object):
                 print("- " + k + " has no API versioning")
         print("\n")               
 
-if __name__ == "__main__":
-    
-    parser = argparse.ArgumentParser()
+# Entry point of both this script and "mars detect", paths being relative to
+# this folder
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog)
     parser.add_argument("--metamodel", type=str, required=True)
+    # Only run some rules, e.g. --rules sharedPersistence circularDependencies
+    parser.add_argument("--rules", type=str, nargs="+", metavar="RULE")
+    parser.add_argument("--skip-rules", type=str, nargs="+", metavar="RULE")
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     metamodel_file = args.metamodel
+    try:
+        rules = Detector.selectRules(args.rules, args.skip_rules)
+    except ValueError as e:
+        parser.error(str(e))
+
+    # The metamodel is streamed one microservice at a time, both the JSON and
+    # the compact binary (.mmb) formats are accepted
+    detector = Detector(rules=rules)
+    results = detector.getResults(mmformat.stream(metamodel_file))
 
-    with open(metamodel_file) as mmfile:
-        metamodel = json.load(mmfile)
-        detector = Detector(metamodel)
-        results = detector.getResults()
+    detector.printResults()
 
-        detector.printResults()
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,36 @@
 from flask import Flask, jsonify, request
-import json
-import subprocess
+import importlib.util
 import os
+import metamodel
+import main as extractor
 
 
 app = Flask(__name__)
 
 
+# The stages run in this process, their dependencies being imported by the
+# first request that needs them
+def loadimporter():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "GitImporter", "main.py")
+    spec = importlib.util.spec_from_file_location("gitimporter", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
 @app.route('/')
 def home():
     return jsonify("Hello")
 
 @app.route('/run')
 def hello():
-    subprocess.run(["python", "main.py"], capture_output=False)
-    with open("../metamodel.json") as jsonFile:
-        jsonObject = json.load(jsonFile)
-    jsonFile.close()
-    return jsonify(jsonObject)
+    extractor.main([])
+    return jsonify(metamodel.load("../metamodel.json"))
 
 @app.route('/clone', methods=['POST'])
 def clone():
     if request.method == 'POST':
         url = request.form.get('repoUrl')
-        subprocess.run(["python3", "../GitImporter/main.py", url], capture_output=False)
+        loadimporter().clone(url)
         subfolders = [f.name for f in os.scandir("../CurrentMBS/Source/") if f.is_dir()]
     return jsonify(subfolders)
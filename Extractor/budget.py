@@ -0,0 +1,87 @@
+import os
+import signal
+import sources
+import threading
+
+
+# Defaults for the per-file budgets, overridden from the command line
+MAX_FILE_BYTES = 4 * 1024 * 1024
+MAX_FILE_SECONDS = 10
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+# Runs func(*args) and interrupts it after `seconds`. The alarm signal is
+# only available on the main thread of Unix systems, elsewhere the call is
+# not bounded.
+def limit(seconds, func, *args):
+    if not seconds or not hasattr(signal, "setitimer") or threading.current_thread() is not threading.main_thread():
+        return func(*args)
+
+    def expired(signum, frame):
+        raise BudgetExceeded()
+
+    previous = signal.signal(signal.SIGALRM, expired)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        return func(*args)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+# Files that went over a budget. They are listed one per line in
+# quarantine_file so later runs go straight to the cheap scan, and recorded
+# with the reason in the quarantine section of the metamodel.
+class Quarantine(object):
+
+    def __init__(self, quarantine_file, max_bytes=MAX_FILE_BYTES, max_seconds=MAX_FILE_SECONDS):
+        self.quarantine_file = quarantine_file
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.entries = []
+        self.files = set()
+        self.previous = set()
+        if os.path.exists(quarantine_file):
+            with open(quarantine_file, "r") as quarantined:
+                self.previous = set(line.rstrip() for line in quarantined if line.strip())
+
+    def add(self, path, stage, reason, action):
+        self.files.add(path)
+        self.entries.append({
+            "file": path,
+            "stage": stage,
+            "reason": reason,
+            "action": action
+        })
+
+    # Runs stage(path) within the budgets. A file already quarantined, over
+    # the byte budget or running out of time is handed to cheap(path)
+    # instead; if even that runs out of time, `skipped` is returned.
+    def run(self, stage_name, path, stage, cheap, skipped):
+        reason = None
+        if path in self.previous:
+            reason = "quarantined by a previous run"
+        elif sources.getsize(path) > self.max_bytes:
+            reason = "over {nb} bytes".format(nb=self.max_bytes)
+        else:
+            try:
+                return limit(self.max_seconds, stage, path)
+            except BudgetExceeded:
+                reason = "over {nb} seconds".format(nb=self.max_seconds)
+
+        print("Quarantining " + path + " (" + reason + ")")
+        try:
+            result = limit(self.max_seconds, cheap, path)
+            self.add(path, stage_name, reason, "cheap scan")
+        except BudgetExceeded:
+            result = skipped
+            self.add(path, stage_name, reason, "skipped")
+        return result
+
+    def save(self):
+        with open(self.quarantine_file, "w") as quarantined:
+            for path in sorted(self.previous | self.files):
+                quarantined.write(path + "\n")
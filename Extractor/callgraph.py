@@ -0,0 +1,114 @@
+import os
+import urllib.parse
+
+
+# Inter-service HTTP calls : every URL found in the code and configuration of
+# a service is split into host, port and path, then looked up in an index of
+# the names each service answers to :
+#   - its folder name
+#   - the compose services built from its folder, or named like it
+#   - the Kubernetes objects declared in its folder
+# and of the ports it listens on (configuration, compose and Kubernetes),
+# for URLs on localhost. The calls are written to system.calls :
+#   [{"from": ..., "to": ..., "url": ..., "host": ..., "port": ..., "path": ...}]
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+_LOCAL_HOSTS = ("localhost", "127.0.0.1", "0.0.0.0", "host.docker.internal")
+
+
+# {"url", "scheme", "host", "port", "path"}, None when there is no host
+def parseurl(url):
+    try:
+        parts = urllib.parse.urlsplit(url.replace("\\\\", "//").strip())
+        port = parts.port
+    except ValueError:
+        return None
+    host = parts.hostname
+    if not host:
+        return None
+    return {
+        "url": url,
+        "scheme": parts.scheme.lower(),
+        "host": host.lower(),
+        "port": port if port is not None else _DEFAULT_PORTS.get(parts.scheme.lower()),
+        "path": parts.path or "/"
+    }
+
+
+class HostIndex(object):
+
+    def __init__(self):
+        self.hosts = dict()   # host name -> services
+        self.ports = dict()   # port -> services
+
+    def addhost(self, host, service):
+        names = self.hosts.setdefault(host.lower(), [])
+        if service not in names:
+            names.append(service)
+
+    def addport(self, port, service):
+        names = self.ports.setdefault(port, [])
+        if service not in names:
+            names.append(service)
+
+    def resolve(self, parsed):
+        if parsed["host"] in self.hosts:
+            return self.hosts[parsed["host"]]
+        if parsed["host"] in _LOCAL_HOSTS:
+            return self.ports.get(parsed["port"], [])
+        # Fully qualified names : order-service.default.svc.cluster.local
+        return self.hosts.get(parsed["host"].split(".")[0], [])
+
+
+# The microservice a descriptor belongs to : the one holding its file, or for
+# descriptors of the system, the one its compose build folder or name points to
+def _owner(descriptor, names, mbsroot):
+    relative = os.path.relpath(descriptor["file"], mbsroot).replace(os.sep, "/").split("/")
+    if len(relative) > 1 and relative[0] in names:
+        return relative[0]
+    if descriptor.get("build"):
+        folder = os.path.normpath(descriptor["build"]).replace(os.sep, "/").split("/")[0]
+        if folder in names:
+            return folder
+    return descriptor["name"] if descriptor["name"] in names else None
+
+
+def buildindex(mm, mbsroot):
+    index = HostIndex()
+    services = mm["system"]["microservices"]
+    names = set(service["name"] for service in services)
+    descriptors = list(mm["system"].get("descriptors", []))
+    for service in services:
+        index.addhost(service["name"], service["name"])
+        for port in service["config"].get("ports", []):
+            index.addport(port, service["name"])
+        descriptors += service["deployment"].get("descriptors", [])
+
+    for descriptor in descriptors:
+        owner = _owner(descriptor, names, mbsroot)
+        if owner is None:
+            continue
+        if isinstance(descriptor["name"], str):
+            index.addhost(descriptor["name"], owner)
+        for port in descriptor["ports"] + descriptor.get("published", []):
+            index.addport(port, owner)
+    return index
+
+
+def extract(mm, mbsroot):
+    index = buildindex(mm, mbsroot)
+    calls = []
+    for service in mm["system"]["microservices"]:
+        seen = set()
+        for url in service["code"]["http"]:
+            parsed = parseurl(url)
+            if parsed is None:
+                continue
+            for target in index.resolve(parsed):
+                if target == service["name"] or (target, url) in seen:
+                    continue
+                seen.add((target, url))
+                call = {"from": service["name"], "to": target}
+                call.update(parsed)
+                calls.append(call)
+    return calls
@@ -1,4 +1,4 @@
-import glob
+import traversal
 
 
 def getcomposefiles(service_path):
@@ -6,7 +6,7 @@ def getcomposefiles(service_path):
     with open("files_needles/docker_compose.txt", "r") as files:
         possibles = files.read().splitlines()
         for possible in possibles:
-            fileslist = glob.glob(service_path + "/**/" + possible, recursive=True)
+            fileslist = traversal.find(service_path, [possible])
             for f in fileslist:
                 compose_files.append(f)
         return compose_files
@@ -1,4 +1,7 @@
-import glob
+import re
+import descriptors
+import sources
+import traversal
 
 
 def getconfigfiles(service_path):
@@ -6,8 +9,32 @@ def getconfigfiles(service_path):
     with open("files_needles/config_files.txt", "r") as files:
         possibles = files.read().splitlines()
         for possible in possibles:
-            fileslist = glob.glob(service_path + "/**/" + possible, recursive=True)
+            fileslist = traversal.find(service_path, [possible])
             for f in fileslist:
                 if "test" not in f.lower():
                     config_files.append(f)
         return config_files
+
+
+# server.port (Spring Boot) or PORT=... lines of a configuration or env file
+_PROPERTY_PORT = re.compile(r"^[ \t]*(?:server\.port|PORT|SERVER_PORT)[ \t]*[=:][ \t]*[\"']?(\d+)", re.M)
+
+
+# Ports a service is configured to listen on
+def getports(config_file):
+    ports = []
+    if config_file.endswith((".yml", ".yaml")):
+        try:
+            for document in descriptors.yaml.load_all(sources.readtext(config_file), Loader=descriptors.yamlloader()):
+                if not isinstance(document, dict):
+                    continue
+                server = document.get("server")
+                port = server.get("port") if isinstance(server, dict) else document.get("server.port")
+                if isinstance(port, int) or isinstance(port, str) and port.isdigit():
+                    ports.append(int(port))
+        except (descriptors.yaml.YAMLError, UnicodeDecodeError, ValueError):
+            pass
+        return ports
+    # .properties files are Latin-1, env files anything : only keys and digits matter
+    text = sources.read(config_file).decode("utf-8", "replace")
+    return [int(port) for port in _PROPERTY_PORT.findall(text)]
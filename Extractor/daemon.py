@@ -0,0 +1,341 @@
+import argparse
+import callgraph
+import contextlib
+import copy
+import ctypes
+import ctypes.util
+import io
+import os
+import select
+import struct
+import time
+import traceback
+import dependencies
+import factcache
+import manifests
+import metamodel
+import microservices
+import budget
+import pipeline
+import sampling
+import traversal
+import main as extractor
+
+
+# Long-running Extractor : everything is extracted once, then the source tree
+# is watched and only the services touched by a change are extracted again,
+# with the per-file facts of unchanged files, the catalogs and the parsed
+# manifests kept in memory. After each change the metamodel is written and
+# the Detector report refreshed. The Detector still runs every rule again,
+# rules are not selected by what changed.
+#   python daemon.py [--metamodel ../metamodel.json] [--report ../report.txt]
+
+MBS_ROOT = "../CurrentMBS/Source"
+EXCLUDE_FILE = "../CurrentMBS/exclude.txt"
+
+##################################
+# Watching the source tree       #
+##################################
+
+_IN_MODIFY = 0x002
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_FROM = 0x040
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_Q_OVERFLOW = 0x4000
+_IN_ISDIR = 0x40000000
+_WATCH_MASK = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+_EVENT = struct.Struct("iIII")
+
+
+# Folders the Extractor never walks are not worth a watch, `files` being the
+# file names next to the folder
+def _unwatched(name, files):
+    return name.startswith(".") or name in traversal.excludeddirs() or traversal.isbuildoutput(name, files)
+
+
+def _filenames(folder):
+    try:
+        return [name for name in os.listdir(folder) if os.path.isfile(os.path.join(folder, name))]
+    except OSError:
+        return []
+
+
+def _watcheddirs(root):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not _unwatched(d, filenames)]
+        yield dirpath, filenames
+
+
+# inotify through libc, one watch per folder. changes() returns the paths
+# changed since the last call, or None when events were lost and everything
+# has to be considered changed.
+class InotifyWatcher(object):
+
+    def __init__(self, root):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self._libc.inotify_init()
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init failed")
+        self.folders = dict()
+        self.addtree(root)
+
+    def addtree(self, root):
+        for dirpath, filenames in _watcheddirs(root):
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(dirpath), _WATCH_MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), "cannot watch " + dirpath)
+            self.folders[wd] = dirpath
+
+    def changes(self, timeout):
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return set()
+        data = os.read(self.fd, 1 << 16)
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = _EVENT.unpack_from(data, offset)
+            name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0")
+            offset += _EVENT.size + length
+            if mask & _IN_Q_OVERFLOW:
+                return None
+            if wd not in self.folders:
+                continue
+            path = os.path.join(self.folders[wd], os.fsdecode(name))
+            created = mask & _IN_ISDIR and mask & (_IN_CREATE | _IN_MOVED_TO)
+            if created and not _unwatched(os.path.basename(path), _filenames(self.folders[wd])):
+                self.addtree(path)
+                # Files written before the watch was added
+                for dirpath, filenames in _watcheddirs(path):
+                    changed.update(os.path.join(dirpath, f) for f in filenames)
+            changed.add(path)
+        return changed
+
+
+# Fallback where inotify is not available : the tree is stat-ed at every tick
+class PollingWatcher(object):
+
+    def __init__(self, root):
+        self.root = root
+        self.snapshot = self.scan()
+
+    def scan(self):
+        snapshot = dict()
+        for dirpath, filenames in _watcheddirs(self.root):
+            for f in filenames:
+                path = os.path.join(dirpath, f)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def changes(self, timeout):
+        time.sleep(timeout)
+        snapshot = self.scan()
+        changed = set(p for p in snapshot.keys() | self.snapshot.keys() if snapshot.get(p) != self.snapshot.get(p))
+        self.snapshot = snapshot
+        return changed
+
+
+def watcher(root):
+    try:
+        return InotifyWatcher(root)
+    except (OSError, AttributeError) as e:
+        print("inotify unavailable (" + str(e) + "), polling " + root)
+        return PollingWatcher(root)
+
+
+# Waits for a change, then keeps collecting until the tree is quiet for
+# `settle` seconds : editors often save in several steps
+def waitchanges(watch, interval, settle=0.05):
+    changed = watch.changes(interval)
+    while changed:
+        more = watch.changes(settle)
+        if more is None:
+            return None
+        if not more:
+            break
+        changed |= more
+    return changed
+
+
+##################################
+# Incremental extraction         #
+##################################
+
+class Daemon(object):
+
+    def __init__(self, args):
+        self.args = args
+        self.cache = factcache.FactCache()
+        self.quarantine = budget.Quarantine("../CurrentMBS/quarantine.txt", args.max_file_bytes, args.max_file_seconds)
+        self.pipeline = pipeline.Pipeline(self.quarantine, args.jobs)
+        self.Detector = extractor.loaddetector()
+        self.tools = dict()
+        self.mm = extractor.blankmetamodel()
+        if args.sample:
+            self.mm["system"]["sample"] = {"fraction": args.sample, "confidence": sampling.CONFIDENCE}
+        self.services = dict()
+        self.system_manifests = None
+        self.excluded = []
+        self.exclude_stamp = self.stampexclude()
+        # Changes of a failed update, tried again with the next change (None
+        # when everything has to be extracted again)
+        self.pending = set()
+        self.pending_exclude = False
+
+    def extractsystem(self):
+        self.excluded = extractor.extractfolders(self.mm, MBS_ROOT)
+        self.system_manifests = manifests.SystemManifests(MBS_ROOT)
+        self.mm["system"]["dependencies"] = dependencies.extract(MBS_ROOT, self.system_manifests)
+        extractor.extractrootconfig(self.mm, MBS_ROOT)
+        extractor.extractroothttp(self.mm, self.quarantine, self.cache)
+        extractor.extractrootdescriptors(self.mm, MBS_ROOT, self.quarantine, self.cache)
+
+    def extractservices(self, names):
+        for name in names:
+            self.services[name] = extractor.extractservice(name, MBS_ROOT, self.system_manifests,
+                                                           self.quarantine, self.cache, self.pipeline,
+                                                           sample=self.args.sample)
+
+    # Effective POMs may change for any service when one manifest changes,
+    # they are cheap to rebuild from the files
+    def refreshdependencies(self):
+        self.system_manifests = manifests.SystemManifests(MBS_ROOT)
+        self.mm["system"]["dependencies"] = dependencies.extract(MBS_ROOT, self.system_manifests)
+        for name, ms_data in self.services.items():
+            ms_data["dependencies"] = dependencies.extract(MBS_ROOT + "/" + name, self.system_manifests)
+
+    def write(self):
+        names = microservices.extract(MBS_ROOT, self.excluded)
+        self.mm["system"]["microservices"] = [self.services[name] for name in names if name in self.services]
+        # A file quarantined again after a change is listed once
+        entries = dict(((e["file"], e["stage"]), e) for e in self.quarantine.entries)
+        self.mm["system"]["quarantine"] = list(entries.values())
+        self.mm["system"]["calls"] = callgraph.extract(self.mm, MBS_ROOT)
+
+        # Nothing is written before the report is ready
+        detector = self.Detector(self.mm, self.tools)
+        detector.getResults()
+        report = io.StringIO()
+        with contextlib.redirect_stdout(report):
+            detector.printResults()
+        self.quarantine.save()
+        metamodel.dump(self.mm, self.args.metamodel, MBS_ROOT)
+        with open(self.args.report, "w") as output:
+            output.write(report.getvalue())
+
+    def build(self):
+        self.extractsystem()
+        self.services = dict()
+        self.extractservices(microservices.extract(MBS_ROOT, self.excluded))
+        self.write()
+
+    # Extracts again what the changed paths touch, everything when the
+    # exclusions changed. Returns the names of the services extracted again.
+    def update(self, changed, excludechanged=False):
+        traversal.refresh()
+        if changed is None:
+            self.build()
+            return list(self.services)
+
+        touched = set()
+        system = excludechanged
+        manifest = False
+        for path in changed:
+            self.cache.forget(path)
+            if os.path.basename(path) in manifests.MANIFESTS:
+                manifest = True
+            relative = os.path.relpath(path, MBS_ROOT).split(os.sep)
+            if len(relative) == 1:
+                system = True
+            else:
+                touched.add(relative[0])
+
+        if system:
+            self.extractsystem()
+        if manifest:
+            self.refreshdependencies()
+
+        names = microservices.extract(MBS_ROOT, self.excluded)
+        for name in [name for name in self.services if name not in names]:
+            del self.services[name]
+        if excludechanged:
+            affected = set(names)
+        else:
+            # Changed services and services added to the system
+            affected = set(name for name in names if name in touched or name not in self.services)
+        self.extractservices(sorted(affected))
+        self.write()
+        return sorted(affected)
+
+    def serve(self):
+        start = time.time()
+        self.build()
+        print("Metamodel written to {mm}, report to {report} ({s:.2f}s)".format(
+            mm=self.args.metamodel, report=self.args.report, s=time.time() - start))
+
+        watch = watcher(MBS_ROOT)
+        while True:
+            changed = waitchanges(watch, self.args.interval)
+            excludechanged = self.excludechanged()
+            if changed is not None and not changed and not excludechanged:
+                continue
+            start = time.time()
+            updated = self.tryupdate(changed, excludechanged)
+            if updated is not None:
+                print("Updated {names} ({s:.2f}s)".format(names=", ".join(updated) or "system", s=time.time() - start))
+
+    # A change the Extractor cannot handle (file removed while being read,
+    # undecodable content...) must not stop the watch : the error is logged,
+    # the previous metamodel and report are kept and the changes are tried
+    # again with the next one
+    def tryupdate(self, changed, excludechanged):
+        if changed is not None and self.pending is not None:
+            changed = changed | self.pending
+        else:
+            changed = None
+        excludechanged = excludechanged or self.pending_exclude
+        state = copy.deepcopy((self.mm, self.services, self.excluded))
+        system_manifests = self.system_manifests
+        try:
+            updated = self.update(changed, excludechanged)
+        except Exception:
+            traceback.print_exc()
+            self.mm, self.services, self.excluded = state
+            self.system_manifests = system_manifests
+            self.pending = changed
+            self.pending_exclude = excludechanged
+            print("Update failed, previous metamodel kept")
+            return None
+        self.pending = set()
+        self.pending_exclude = False
+        return updated
+
+    def stampexclude(self):
+        return os.stat(EXCLUDE_FILE).st_mtime_ns if os.path.exists(EXCLUDE_FILE) else None
+
+    # exclude.txt sits outside the watched tree
+    def excludechanged(self):
+        stamp = self.stampexclude()
+        changed = stamp != self.exclude_stamp
+        self.exclude_stamp = stamp
+        return changed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--report", type=str, default="../report.txt")
+    # Seconds between two looks at the tree when nothing happens
+    parser.add_argument("--interval", type=float, default=0.5)
+    args = extractor.parsearguments(parser)
+    daemon = Daemon(args)
+    try:
+        daemon.serve()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.pipeline.close()
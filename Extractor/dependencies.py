@@ -1,15 +1,14 @@
-import os
-import json
+import manifests
 
 
-def extract(system):
+# system_manifests is the manifests.SystemManifests of the whole system, so
+# the manifests of a service are not read again after the root run
+def extract(system, system_manifests=None):
+    if system_manifests is None:
+        system_manifests = manifests.SystemManifests(system)
     dependencies = []
-    os.system('ruby ManifestParser/scanner.rb ' + system + ' > raw_dependencies.json')
-    with open("raw_dependencies.json") as raw_dependencies:
-        data = json.load(raw_dependencies)
-        for node in data:
-            if node["platform"] == "maven" and node["dependencies"]:
-                for item in node["dependencies"]:
-                    dependencies.append(item["name"])
-    os.remove("raw_dependencies.json")
+    for node in system_manifests.analyse(system):
+        if node["platform"] == "maven" and node["dependencies"]:
+            for item in node["dependencies"]:
+                dependencies.append(item["name"])
     return dependencies
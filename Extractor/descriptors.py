@@ -0,0 +1,165 @@
+import lazy
+import sources
+import traversal
+
+yaml = lazy.load("yaml")
+
+
+# Deployment descriptors : docker-compose files, Kubernetes manifests and
+# rendered Helm charts. Every YAML file is read as a stream of documents with
+# the libyaml loader, each document is summed up and dropped before the next
+# one is parsed. One descriptor per compose service or Kubernetes object :
+#   {"file": ..., "kind": "Deployment" (or "compose"), "apiVersion": ...,
+#    "name": ..., "images": [...], "replicas": 3 (or None),
+#    "probes": ["liveness", "readiness"...], "ports": [8080...],
+#    "published": [80...] (ports reachable from the host), "build": "./order"}
+
+# Kubernetes kinds and the path from the object to its pod spec
+_POD_SPECS = {
+    "Pod": ("spec",),
+    "Deployment": ("spec", "template", "spec"),
+    "StatefulSet": ("spec", "template", "spec"),
+    "DaemonSet": ("spec", "template", "spec"),
+    "ReplicaSet": ("spec", "template", "spec"),
+    "ReplicationController": ("spec", "template", "spec"),
+    "Job": ("spec", "template", "spec"),
+    "CronJob": ("spec", "jobTemplate", "spec", "template", "spec"),
+}
+
+_PROBES = (("livenessProbe", "liveness"), ("readinessProbe", "readiness"), ("startupProbe", "startup"))
+
+
+# libyaml when PyYAML was built with it
+def yamlloader():
+    return getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def getdescriptorfiles(service_path):
+    descriptor_files = []
+    with open("files_needles/yaml_files.txt", "r") as files:
+        possibles = files.read().splitlines()
+        for possible in possibles:
+            fileslist = traversal.find(service_path, [possible])
+            for f in fileslist:
+                if "test" not in f.lower():
+                    descriptor_files.append(f)
+        return descriptor_files
+
+
+def getrootdescriptorfiles(service_path):
+    descriptor_files = []
+    with open("files_needles/yaml_files.txt", "r") as files:
+        possibles = files.read().splitlines()
+        for possible in possibles:
+            descriptor_files += traversal.find(service_path, [possible], recursive=False)
+        return descriptor_files
+
+
+def _get(node, *path):
+    for key in path:
+        if not isinstance(node, dict):
+            return None
+        node = node.get(key)
+    return node
+
+
+def _list(node):
+    return node if isinstance(node, list) else []
+
+
+# "8080:80", "127.0.0.1:8080:80/tcp", 80 or {"target": 80, "published": 8080}
+# -> (80, 8080) : the port the container listens on, the one of the host
+def _composeport(port):
+    if isinstance(port, dict):
+        target, published = port.get("target"), port.get("published")
+    elif isinstance(port, str):
+        parts = port.split("/")[0].split(":")
+        target, published = parts[-1], parts[-2] if len(parts) > 1 else None
+    else:
+        target, published = port, None
+    return _port(target), _port(published)
+
+
+def _port(value):
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return None
+
+
+def _compose(path, document):
+    descriptors = []
+    services = document.get("services")
+    if not isinstance(services, dict):
+        return descriptors
+    for name, service in services.items():
+        if not isinstance(service, dict):
+            continue
+        ports = [_composeport(port) for port in _list(service.get("ports")) + _list(service.get("expose"))]
+        build = service.get("build")
+        if isinstance(build, dict):
+            build = build.get("context")
+        descriptors.append({
+            "file": path,
+            "kind": "compose",
+            "apiVersion": None,
+            "name": str(name),
+            "images": [service["image"]] if isinstance(service.get("image"), str) else [],
+            "replicas": _get(service, "deploy", "replicas"),
+            "probes": ["healthcheck"] if isinstance(service.get("healthcheck"), dict)
+                      and not service["healthcheck"].get("disable") else [],
+            "ports": [target for target, published in ports if target is not None],
+            "published": [published for target, published in ports if published is not None],
+            "build": build if isinstance(build, str) else None
+        })
+    return descriptors
+
+
+def _kubernetes(path, document):
+    kind = document["kind"]
+    spec = _get(document, *_POD_SPECS[kind]) if kind in _POD_SPECS else None
+    containers = _list(_get(spec, "containers")) + _list(_get(spec, "initContainers"))
+    containers = [container for container in containers if isinstance(container, dict)]
+    ports = []
+    for container in containers:
+        ports += [_get(port, "containerPort") for port in _list(container.get("ports"))]
+    # Services expose ports without running anything
+    ports += [_get(port, "port") for port in _list(_get(document, "spec", "ports"))] if kind == "Service" else []
+    return [{
+        "file": path,
+        "kind": str(kind),
+        "apiVersion": str(document.get("apiVersion")) if document.get("apiVersion") is not None else None,
+        "name": _get(document, "metadata", "name"),
+        "images": [container["image"] for container in containers if isinstance(container.get("image"), str)],
+        "replicas": _get(document, "spec", "replicas") if kind in _POD_SPECS else None,
+        "probes": list(dict.fromkeys(probe for key, probe in _PROBES for container in containers
+                                     if isinstance(container.get(key), dict))),
+        "ports": [port for port in ports if isinstance(port, int)],
+        "published": [_get(port, "nodePort") for port in _list(_get(document, "spec", "ports"))
+                      if kind == "Service" and isinstance(_get(port, "nodePort"), int)],
+        "build": None
+    }]
+
+
+# Descriptors of one YAML file, streamed to the loader. Documents before a
+# syntax error (a Helm template that was not rendered...) are kept.
+def parse(path):
+    descriptors = []
+    try:
+        with sources.openbinary(path) as stream:
+            for document in yaml.load_all(stream, Loader=yamlloader()):
+                if not isinstance(document, dict):
+                    continue
+                # Kubernetes lists (kubectl get -o yaml)
+                if document.get("kind") == "List" and isinstance(document.get("items"), list):
+                    for item in document["items"]:
+                        if isinstance(item, dict) and isinstance(item.get("kind"), str):
+                            descriptors += _kubernetes(path, item)
+                elif isinstance(document.get("kind"), str) and "apiVersion" in document:
+                    descriptors += _kubernetes(path, document)
+                elif isinstance(document.get("services"), dict):
+                    descriptors += _compose(path, document)
+    except (yaml.YAMLError, UnicodeDecodeError, ValueError):
+        pass
+    return descriptors
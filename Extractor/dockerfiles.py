@@ -1,5 +1,9 @@
-import glob
-from dockerfile_parse import DockerfileParser
+import io
+import lazy
+import sources
+import traversal
+
+dockerfile_parse = lazy.load("dockerfile_parse")
 
 
 def getdockerfiles(service_path):
@@ -7,16 +11,20 @@ def getdockerfiles(service_path):
     with open("files_needles/docker_files.txt", "r") as files:
         possibles = files.read().splitlines()
         for possible in possibles:
-            fileslist = glob.glob(service_path + "/**/" + possible, recursive=True)
+            fileslist = traversal.find(service_path, [possible])
             for f in fileslist:
                 docker_files.append(f)
         return docker_files
 
 
+# The content is kept in memory, not written to ./Dockerfile, so that files
+# can be parsed by several processes at once
 def parse(dockerfile):
-    dfp = DockerfileParser()
-    file = open(dockerfile, "r")
-    dfp.content = file.read()
-    file.close()
+    dfp = dockerfile_parse.DockerfileParser(fileobj=io.BytesIO())
+    dfp.content = sources.readtext(dockerfile)
 
     return dfp
+
+
+def getbaseimage(dockerfile):
+    return parse(dockerfile).baseimage
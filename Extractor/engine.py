@@ -0,0 +1,268 @@
+import hashlib
+import os
+import re
+import javaparser
+import sources
+import traversal
+
+
+# Fact extraction for every supported language : imports, annotations (or
+# decorators) and function names of a source file. Java goes through the
+# lexer of javaparser, other languages through extractors registered by file
+# extension below.
+#
+# Their files are listed in files_needles/engine_files.txt, apart from the
+# Java source files (source_files.txt) : they only give facts, the HTTP and
+# database scans and the metamodel source_files stay Java only.
+#
+# Those extractors work on top-level regions : a region starts on a line
+# beginning at column 0 outside any string, comment or bracket. Facts are
+# kept per region content, so a region found again (in a copy of a file, or
+# unchanged in the next revision) skips the import, annotation and method
+# regexes. The whole file is still masked and split on every call.
+
+MAX_REGIONS = 200000
+
+_extractors = dict()   # extension -> Extractor
+_regions = dict()      # (language, region digest) -> facts
+
+
+class Extractor(object):
+
+    # masking : regex whose matches are strings or comments, group 1 being
+    # the string literal when it is one. Strings keep their prefix and quotes
+    # and everything keeps its newlines, so offsets in the masked text are
+    # offsets in the source.
+    def __init__(self, language, masking, imports, annotations, methods):
+        self.language = language
+        self.masking = masking
+        self.imports = imports
+        self.annotations = annotations
+        self.methods = methods
+
+    def mask(self, content):
+        def blank(match):
+            text = match.group(0)
+            literal = match.group(1)
+            if literal is None:
+                return re.sub(r"[^\n]", " ", text)
+            quote = 3 if literal[:3] in ('"""', "'''") and len(literal) >= 6 else 1
+            inside = re.sub(r"[^\n]", " ", literal[quote:len(literal) - quote])
+            return text[:len(text) - len(literal)] + literal[:quote] + inside + literal[len(literal) - quote:]
+        return self.masking.sub(blank, content)
+
+    def regions(self, content, masked):
+        starts = [0]
+        depth = 0
+        offset = 0
+        for line in masked.splitlines(True):
+            if offset and depth == 0 and line[:1] not in ("", " ", "\t", "\n", "\r", ")", "}", "]"):
+                starts.append(offset)
+            for c in line:
+                if c in "([{":
+                    depth += 1
+                elif c in ")]}" and depth > 0:
+                    depth -= 1
+            offset += len(line)
+        starts.append(len(content))
+        return [(starts[i], starts[i + 1]) for i in range(len(starts) - 1) if starts[i] < starts[i + 1]]
+
+    def extract(self, content, masked):
+        return self.imports(content, masked), self.annotations(content, masked), self.methods(content, masked)
+
+    def getfacts(self, content):
+        masked = self.mask(content)
+        imports, annotations, methods = [], [], []
+        for start, end in self.regions(content, masked):
+            region = content[start:end]
+            key = (self.language, hashlib.blake2b(region.encode("utf-8", "surrogatepass"), digest_size=16).digest())
+            facts = _regions.get(key)
+            if facts is None:
+                facts = self.extract(region, masked[start:end])
+                if len(_regions) >= MAX_REGIONS:
+                    del _regions[next(iter(_regions))]
+                _regions[key] = facts
+            imports += facts[0]
+            annotations += facts[1]
+            methods += facts[2]
+        return imports, annotations, methods
+
+
+def register(extensions, extractor):
+    for extension in extensions:
+        _extractors[extension] = extractor
+
+
+def extension(path):
+    return os.path.splitext(path)[1].lstrip(".").lower()
+
+
+# Source files of the other languages, tests left out like Java ones
+def getsourcefiles(service_path):
+    source_files = []
+    with open("files_needles/engine_files.txt", "r") as files:
+        for possible in files.read().splitlines():
+            for f in traversal.find(service_path, [possible]):
+                if "test" not in f.lower():
+                    source_files.append(f)
+    return source_files
+
+
+def supported(path):
+    return extension(path) == "java" or extension(path) in _extractors
+
+
+# Imports, annotations and methods of any supported source file, nothing for
+# the others
+def getfacts(source_file, cheap=False):
+    if extension(source_file) == "java":
+        return javaparser.getfacts(source_file, cheap)
+    extractor = _extractors.get(extension(source_file))
+    if extractor is None:
+        return [], [], []
+    return extractor.getfacts(sources.readtext(source_file))
+
+
+##################################
+# Helpers                        #
+##################################
+
+# Groups of every match of regex on the masked text
+def _groups(regex, masked, group=1):
+    return [match.group(group) for match in regex.finditer(masked)]
+
+
+_C_COMMENTS = r"//[^\n]*|/\*.*?\*/"
+
+
+##################################
+# Python                         #
+##################################
+
+_PYTHON_MASK = re.compile(r'''#[^\n]*|(?:[rRbBuUfF]{0,2})((\'\'\'|""")(?:\\.|.)*?\2|('|")(?:\\.|(?!\3)[^\\\n])*\3)''', re.S)
+_PYTHON_IMPORT = re.compile(r"^[ \t]*import[ \t]+([\w. \t,]+)", re.M)
+_PYTHON_FROM = re.compile(r"^[ \t]*from[ \t]+([\w.]+)[ \t]+import[ \t]+(\([^)]*\)|[\w. \t,*]+)", re.M)
+_PYTHON_DECORATOR = re.compile(r"^[ \t]*@[ \t]*([\w.]+)", re.M)
+_PYTHON_DEF = re.compile(r"^[ \t]*(?:async[ \t]+)?def[ \t]+(\w+)", re.M)
+
+
+def _pythonnames(names):
+    # "a as b, c" -> ["a", "c"]
+    return [name.split()[0] for name in names.strip("()").replace("\n", " ").split(",") if name.strip()]
+
+
+def _pythonimports(content, masked):
+    imports = []
+    for match in re.finditer(r"^[ \t]*(?:import|from)[ \t]", masked, re.M):
+        plain = _PYTHON_IMPORT.match(masked, match.start())
+        if plain:
+            imports += _pythonnames(plain.group(1))
+            continue
+        fromimport = _PYTHON_FROM.match(masked, match.start())
+        if fromimport:
+            module = fromimport.group(1)
+            for name in _pythonnames(fromimport.group(2)):
+                imports.append(module if name == "*" else module.rstrip(".") + "." + name if module.strip(".") else module + name)
+    return imports
+
+
+register(["py"], Extractor("python", _PYTHON_MASK, _pythonimports,
+                           lambda content, masked: _groups(_PYTHON_DECORATOR, masked),
+                           lambda content, masked: _groups(_PYTHON_DEF, masked)))
+
+
+##################################
+# Go                             #
+##################################
+
+_GO_MASK = re.compile(_C_COMMENTS + r'''|(("|')(?:\\.|(?!\2)[^\\\n])*\2|(`)[^`]*`)''', re.S)
+_GO_IMPORT = re.compile(r'^import[ \t]+(?:[\w.]+[ \t]+)?("[^"\n]*")', re.M)
+_GO_IMPORT_BLOCK = re.compile(r"^import[ \t]*\(([^)]*)\)", re.M)
+_GO_BLOCK_ENTRY = re.compile(r'("[^"\n]*")')
+_GO_FUNC = re.compile(r"^func[ \t]+(?:\([^)]*\)[ \t]*)?(\w+)", re.M)
+
+
+def _goimports(content, masked):
+    imports = []
+    for match in re.finditer(r"^import\b", masked, re.M):
+        block = _GO_IMPORT_BLOCK.match(masked, match.start())
+        if block:
+            offset = block.start(1)
+            for entry in _GO_BLOCK_ENTRY.finditer(block.group(1)):
+                imports.append(content[offset + entry.start(1) + 1:offset + entry.end(1) - 1])
+            continue
+        single = _GO_IMPORT.match(masked, match.start())
+        if single:
+            imports.append(content[single.start(1) + 1:single.end(1) - 1])
+    return imports
+
+
+# Go has no annotations
+register(["go"], Extractor("go", _GO_MASK, _goimports,
+                           lambda content, masked: [],
+                           lambda content, masked: _groups(_GO_FUNC, masked)))
+
+
+##################################
+# JavaScript and TypeScript      #
+##################################
+
+_JS_MASK = re.compile(_C_COMMENTS + r'''|((`)(?:\\.|[^\\`])*`|("|')(?:\\.|(?!\3)[^\\\n])*\3)''', re.S)
+_JS_IMPORT = re.compile(r'''\b(?:import|export)\s+(?:type\s+)?[\w*{}\s,$]*?\s*from\s*(["'][^"'\n]*["'])|'''
+                        r'''\bimport\s*(["'][^"'\n]*["'])|'''
+                        r'''\b(?:require|import)\s*\(\s*(["'][^"'\n]*["'])\s*\)''')
+_JS_DECORATOR = re.compile(r"(?:^|[\s(,])@([A-Za-z_$][\w$.]*)", re.M)
+_JS_FUNCTION = re.compile(r"\bfunction\b\s*\*?\s*([A-Za-z_$][\w$]*)")
+_JS_ARROW = re.compile(r"\b(?:const|let|var)\s+([A-Za-z_$][\w$]*)\s*(?::[^=;\n]+)?=\s*(?:async\s+)?"
+                       r"(?:function\b|\([^()]*\)\s*(?::\s*[^=;{\n]+)?=>|[A-Za-z_$][\w$]*\s*=>)")
+_JS_METHOD = re.compile(r"^[ \t]+(?:(?:public|private|protected|static|async|get|set|readonly|override|abstract)\s+)*"
+                        r"\*?([A-Za-z_$][\w$]*)\s*(?:<[^>\n]*>)?\s*\([^)]*\)\s*(?::\s*[^{;\n]+)?\{", re.M)
+# Constructors are not methods, as for Java
+_JS_KEYWORDS = {"if", "for", "while", "switch", "catch", "function", "return", "with", "else", "do", "try", "new",
+                "constructor"}
+
+
+def _jsimports(content, masked):
+    imports = []
+    for match in _JS_IMPORT.finditer(masked):
+        group = next(g for g in (1, 2, 3) if match.group(g) is not None)
+        literal = content[match.start(group) + 1:match.end(group) - 1]
+        if literal:
+            imports.append(literal)
+    return imports
+
+
+def _jsmethods(content, masked):
+    found = []
+    for regex in (_JS_FUNCTION, _JS_ARROW, _JS_METHOD):
+        for match in regex.finditer(masked):
+            if match.group(1) not in _JS_KEYWORDS:
+                found.append((match.start(), match.group(1)))
+    return [name for start, name in sorted(found)]
+
+
+register(["js", "jsx", "mjs", "cjs", "ts", "tsx"], Extractor("javascript", _JS_MASK, _jsimports,
+                                                            lambda content, masked: _groups(_JS_DECORATOR, masked),
+                                                            _jsmethods))
+
+
+##################################
+# Kotlin                         #
+##################################
+
+_KOTLIN_MASK = re.compile(_C_COMMENTS + r'''|((""")(?:.)*?"""|("|')(?:\\.|(?!\3)[^\\\n])*\3)''', re.S)
+_KOTLIN_IMPORT = re.compile(r"^[ \t]*import[ \t]+([\w`]+(?:\.[\w`]+)*(?:\.\*)?)", re.M)
+# Not the labels of return@forEach or this@Outer
+_KOTLIN_ANNOTATION = re.compile(r"(?<![\w@])@(?:\w+:)?([A-Za-z_][\w.]*)")
+_KOTLIN_FUN = re.compile(r"\bfun\s+(?:<[^>]*>\s*)?(?:[\w.<>?, ]+\.)?(\w+)\s*\(")
+
+
+def _kotlinimports(content, masked):
+    # Same form as the Java imports : "a.b.*" is kept as "a.b"
+    return [name.replace("`", "")[:-2] if name.endswith(".*") else name.replace("`", "")
+            for name in _KOTLIN_IMPORT.findall(masked)]
+
+
+register(["kt"], Extractor("kotlin", _KOTLIN_MASK, _kotlinimports,
+                           lambda content, masked: _groups(_KOTLIN_ANNOTATION, masked),
+                           lambda content, masked: _groups(_KOTLIN_FUN, masked)))
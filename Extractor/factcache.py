@@ -0,0 +1,49 @@
+import pipeline
+import sources
+
+
+# Per-file results kept by a long-running process (see daemon.py). An entry
+# is reused as long as the file keeps its stamp (modification time and size,
+# or blob id for a git revision).
+# With bycontent, entries are keyed by stamp alone : across the revisions of
+# history.py a blob is parsed once whatever its path. Results naming their
+# file (pipeline.BY_PATH) are still kept per path.
+class FactCache(object):
+
+    def __init__(self, bycontent=False):
+        self.entries = dict()
+        self.bycontent = bycontent
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, stage, path, compute):
+        found, value = self.lookup(stage, path)
+        if found:
+            return value
+        value = compute(path)
+        self.store(stage, path, value)
+        return value
+
+    def key(self, stage, path, stamp):
+        if self.bycontent and stage not in pipeline.BY_PATH:
+            return stage, stamp
+        return stage, path
+
+    # (True, value) while the file keeps its stamp, (False, None) otherwise
+    def lookup(self, stage, path):
+        stamp = sources.stamp(path)
+        key = self.key(stage, path, stamp)
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] == stamp:
+            self.hits += 1
+            return True, entry[1]
+        self.misses += 1
+        return False, None
+
+    def store(self, stage, path, value):
+        stamp = sources.stamp(path)
+        self.entries[self.key(stage, path, stamp)] = (stamp, value)
+
+    def forget(self, path):
+        for key in [key for key in self.entries if key[1] == path]:
+            del self.entries[key]
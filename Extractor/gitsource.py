@@ -0,0 +1,91 @@
+import lazy
+import sources
+import threading
+
+git = lazy.load("git")
+
+
+# Files of one git revision, read from the object database of a clone
+# without any checkout. Folders are listed lazily, so pruned folders are
+# never read.
+class GitSource(object):
+
+    def __init__(self, repository, revision):
+        self.repository = repository
+        self.revision = revision
+        self.repo = git.Repo(repository)
+        self.commit = self.repo.commit(revision)
+        self._folders = {"": self.commit.tree}
+        self._objects = dict()
+        self._listings = dict()
+        # The cat-file process of GitPython serves one reader at a time
+        self._lock = threading.Lock()
+
+    def _object(self, relpath):
+        if relpath not in self._folders and relpath not in self._objects:
+            folder = relpath.rsplit("/", 1)[0] if "/" in relpath else ""
+            if folder != relpath and self.isdir(folder):
+                self.listdir(folder)
+        return self._folders.get(relpath, self._objects.get(relpath))
+
+    def isdir(self, relpath):
+        self._object(relpath)
+        return relpath in self._folders
+
+    def exists(self, relpath):
+        return self._object(relpath) is not None
+
+    def listdir(self, relpath):
+        if relpath not in self._listings:
+            if not self.isdir(relpath):
+                raise NotADirectoryError(relpath)
+            tree = self._folders[relpath]
+            listing = []
+            for item in tree:
+                path = relpath + "/" + item.name if relpath else item.name
+                # Submodules have no content in this repository
+                if item.type == "tree":
+                    self._folders[path] = item
+                elif item.type == "blob":
+                    self._objects[path] = item
+                else:
+                    continue
+                listing.append((item.name, item.type == "tree"))
+            self._listings[relpath] = listing
+        return self._listings[relpath]
+
+    def _blob(self, relpath):
+        blob = self._object(relpath)
+        if blob is None or self.isdir(relpath):
+            raise FileNotFoundError(relpath)
+        return blob
+
+    def read(self, relpath):
+        with self._lock:
+            return self._blob(relpath).data_stream.read()
+
+    def getsize(self, relpath):
+        return self._blob(relpath).size
+
+    def stamp(self, relpath):
+        return self._blob(relpath).hexsha
+
+    # Revision section of the metamodel, the Detector mounts it again from there
+    def describe(self, root):
+        return {
+            "repository": self.repository,
+            "revision": self.revision,
+            "commit": self.commit.hexsha,
+            "date": self.commit.committed_datetime.isoformat(),
+            "root": root
+        }
+
+
+# Mounts `revision` of the clone at `repository` on a virtual root
+# (repository@revision, or the given root) and returns that root
+def mountrevision(repository, revision, root=None):
+    source = GitSource(repository, revision)
+    if root is None:
+        root = repository.rstrip("/") + "@" + revision
+    sources.mount(root, source)
+    return root, source
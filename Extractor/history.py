@@ -0,0 +1,102 @@
+import argparse
+import contextlib
+import json
+import os
+import budget
+import callgraph
+import dependencies
+import factcache
+import gitsource
+import lazy
+import manifests
+import microservices
+import sources
+import traversal
+import main as extractor
+
+git = lazy.load("git")
+
+
+# Antipattern trends over the history of a clone : every revision is read
+# from the git objects (see gitsource.py), extracted and run through the
+# Detector. Facts are kept by blob id, so a file is only parsed again in the
+# revisions where its content changed.
+#   python history.py --last 20
+#   python history.py --tags --output ../history.json
+#   python history.py --revisions v1.0 v2.0 HEAD
+
+def revisions(repository, args):
+    repo = git.Repo(repository)
+    if args.revisions:
+        return args.revisions
+    if args.tags:
+        tags = sorted(repo.tags, key=lambda tag: tag.commit.committed_datetime)
+        return [tag.name for tag in tags]
+    commits = list(repo.iter_commits(args.ref, max_count=args.last, first_parent=True))
+    return [commit.hexsha for commit in reversed(commits)]
+
+
+def extractrevision(repository, revision, quarantine, cache):
+    root, source = gitsource.mountrevision(repository, revision)
+    mm = extractor.blankmetamodel()
+    mm["system"]["revision"] = source.describe(root)
+    excluded = extractor.extractfolders(mm, root)
+    system_manifests = manifests.SystemManifests(root)
+    mm["system"]["dependencies"] = dependencies.extract(root, system_manifests)
+    extractor.extractrootconfig(mm, root)
+    extractor.extractroothttp(mm, quarantine, cache)
+    extractor.extractrootdescriptors(mm, root, quarantine, cache)
+    mm["system"]["microservices"] = [extractor.extractservice(name, root, system_manifests, quarantine, cache)
+                                     for name in microservices.extract(root, excluded)]
+    mm["system"]["calls"] = callgraph.extract(mm, root)
+    return root, mm
+
+
+def run(args):
+    Detector = extractor.loaddetector()
+    tools = dict()
+    # Paths differ from one revision to the other, contents are what matters
+    cache = factcache.FactCache(bycontent=True)
+    # Budgets apply, but the quarantine list of the working tree is left alone
+    quarantine = budget.Quarantine(os.devnull, args.max_file_bytes, args.max_file_seconds)
+
+    series = []
+    for revision in revisions(args.repository, args):
+        hits, misses = cache.hits, cache.misses
+        with open(os.devnull, "w") as quiet, contextlib.redirect_stdout(quiet):
+            root, mm = extractrevision(args.repository, revision, quarantine, cache)
+            detector = Detector(mm, tools)
+            detector.getResults()
+        traversal.droptree(root)
+        sources.unmount(root)
+
+        findings = detector.getFindings()
+        point = dict(mm["system"]["revision"])
+        del point["root"]
+        point["nbServices"] = len(mm["system"]["microservices"])
+        point["counts"] = dict((rule, len(found)) for rule, found in findings.items())
+        point["findings"] = findings
+        series.append(point)
+
+        print("{rev} ({date}) : {nb} services, file facts {parsed} computed, {reused} reused".format(
+            rev=revision, date=point["date"][:10], nb=point["nbServices"],
+            parsed=cache.misses - misses, reused=cache.hits - hits))
+        print("    " + ", ".join(rule + "=" + str(count) for rule, count in point["counts"].items() if count))
+
+    with open(args.output, "w") as output:
+        json.dump({"repository": args.repository, "revisions": series}, output, indent=2)
+    print("Time series written to " + args.output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repository", type=str, default="../CurrentMBS/Source")
+    parser.add_argument("--output", type=str, default="../history.json")
+    # Revisions, oldest first : given ones, every tag, or the last commits of --ref
+    parser.add_argument("--revisions", type=str, nargs="+")
+    parser.add_argument("--tags", action="store_true")
+    parser.add_argument("--last", type=int, default=10)
+    parser.add_argument("--ref", type=str, default="HEAD")
+    parser.add_argument("--max-file-bytes", type=int, default=budget.MAX_FILE_BYTES)
+    parser.add_argument("--max-file-seconds", type=float, default=budget.MAX_FILE_SECONDS)
+    run(parser.parse_args())
@@ -1,6 +1,11 @@
-import glob
-import javalang
+import functools
+import lazy
+import mmap
 import re
+import sources
+import traversal
+
+javalang = lazy.load("javalang")
 
 
 def getsourcefiles(service_path):
@@ -8,7 +13,7 @@ def getsourcefiles(service_path):
     with open("files_needles/source_files.txt", "r") as files:
         possibles = files.read().splitlines()
         for possible in possibles:
-            fileslist = glob.glob(service_path + "/**/" + possible, recursive=True)
+            fileslist = traversal.find(service_path, [possible])
             for f in fileslist:
                 if "test" not in f.lower():
                     source_files.append(f)
@@ -19,7 +24,7 @@ def getconfigfiles(service_path):
     with open("files_needles/config_files.txt", "r") as files:
         possibles = files.read().splitlines()
         for possible in possibles:
-            fileslist = glob.glob(service_path + "/**/" + possible, recursive=True)
+            fileslist = traversal.find(service_path, [possible])
             for f in fileslist:
                 if "test" not in f.lower():
                     config_files.append(f)
@@ -31,7 +36,7 @@ def getrootconfigfiles(service_path):
     with open("files_needles/config_files.txt", "r") as files:
         possibles = files.read().splitlines()
         for possible in possibles:
-            fileslist = glob.glob(service_path + "/" + possible, recursive=True)
+            fileslist = traversal.find(service_path, [possible], recursive=False)
             for f in fileslist:
                 if "test" not in f.lower():
                     config_files.append(f)
@@ -43,19 +48,12 @@ def getenvfiles(service_path):
     with open("files_needles/env_files.txt", "r") as files:
         possibles = files.read().splitlines()
         for possible in possibles:
-            fileslist = glob.glob(service_path + "/**/" + possible, recursive=True)
+            fileslist = traversal.find(service_path, [possible])
             for f in fileslist:
                 if "test" not in f.lower():
                    env_files.append(f)
         return env_files
 
-def parse(source_file):
-    file = open(source_file, "r")
-    content = file.read()
-    tree = javalang.parse.parse(content)
-    file.close()
-    return tree
-
 
 def getmethods(tree):
     method = []
@@ -78,10 +76,271 @@ def getimports(tree):
     return imports
 
 
-def gethttpdb(source):
-    file = open(source, "r")
-    content = file.read()
-    file.close()
+######################################
+# Fast lexer-level fact extraction   #
+######################################
+
+# Imports, annotation names and method names only need a token stream and
+# the brace structure, not a full AST. scan() gets them from a regex
+# tokenizer and reports when it is unsure of the result, getfacts() then
+# falls back on javalang.
+
+_JAVA_TOKEN = re.compile(r'''
+    \s+ | //[^\n]* | /\*.*?\*/
+  | ("""(?:\\.|[^\\])*?"""
+  | "(?:\\.|[^"\\\n])*"
+  | '(?:\\.|[^'\\\n])+'
+  | [^\W\d][\w$]* | \$[\w$]*
+  | \.?\d[\w.]*
+  | ->|::|\.\.\.|.)
+''', re.S | re.X)
+
+_MODIFIERS = {"public", "protected", "private", "static", "final", "abstract", "native", "synchronized",
+              "transient", "volatile", "strictfp", "default", "sealed", "non", "-"}
+_TYPE_KEYWORDS = {"class": "type", "interface": "type", "enum": "enum", "record": "type"}
+
+
+class _Frame(object):
+
+    # kind : file, type, enum, annotation or block
+    def __init__(self, kind):
+        self.kind = kind
+        self.parens = []
+        self.constants = kind == "enum"
+        self.newpending = False
+        self.reset()
+
+    def reset(self):
+        self.prefix = []
+        self.pending = None
+        self.seenparen = False
+        self.seenassign = False
+
+
+# Whether a member prefix (tokens before "name(") holds a return type,
+# which tells a method from a constructor
+def _hasreturntype(prefix):
+    i = 0
+    while i < len(prefix) and prefix[i] in _MODIFIERS:
+        i += 1
+    if i < len(prefix) and prefix[i] == "<":
+        depth = 0
+        while i < len(prefix):
+            depth += {"<": 1, ">": -1}.get(prefix[i], 0)
+            i += 1
+            if depth == 0:
+                break
+    return i < len(prefix)
+
+
+def scan(content):
+    imports = []
+    annotations = []
+    methods = []
+    sure = True
+
+    tokens = [t for t in _JAVA_TOKEN.findall(content) if t]
+    n = len(tokens)
+    stack = [_Frame("file")]
+    anonymous = False
+    i = 0
+    while i < n:
+        tok = tokens[i]
+        frame = stack[-1]
+        member = frame.kind in ("type", "enum", "annotation") and not frame.parens
+
+        if tok == "import" and len(stack) == 1:
+            end = i + 1
+            while end < n and tokens[end] != ";":
+                end += 1
+            path = [t for t in tokens[i + 1:end] if t != "static"]
+            if path[-2:] == [".", "*"]:
+                path = path[:-2]
+            imports.append("".join(path))
+            i = end + 1
+            continue
+
+        if tok == "@":
+            if i + 1 < n and tokens[i + 1] == "interface":
+                frame.pending = "annotation"
+                i += 2
+                continue
+            end = i + 1
+            while end + 2 < n and tokens[end + 1] == "." and tokens[end + 2] != "interface":
+                end += 2
+            annotations.append("".join(tokens[i + 1:end + 1]))
+            i = end + 1
+            if i < n and tokens[i] == "(":
+                frame.parens.append(False)
+                i += 1
+            continue
+
+        if tok == "{":
+            if anonymous:
+                kind = "type"
+            elif frame.pending is not None:
+                kind = frame.pending
+            elif frame.constants and not frame.parens:
+                kind = "type"
+            else:
+                kind = "block"
+            if not frame.parens:
+                frame.pending = None
+            stack.append(_Frame(kind))
+            anonymous = False
+            i += 1
+            continue
+        anonymous = False
+
+        if tok == "}":
+            if len(stack) == 1 or frame.parens:
+                sure = False
+                break
+            stack.pop()
+            parent = stack[-1]
+            if not parent.parens and not parent.seenassign:
+                parent.reset()
+            i += 1
+            continue
+
+        if tok == "(":
+            creator = frame.newpending
+            frame.newpending = False
+            if member and not frame.seenparen and not frame.seenassign:
+                frame.seenparen = True
+                name = tokens[i - 1]
+                if frame.kind == "annotation" or frame.pending is not None or (frame.constants and frame.kind == "enum"):
+                    pass
+                elif frame.prefix and frame.prefix[-1] == name and _hasreturntype(frame.prefix[:-1]):
+                    methods.append(name)
+            frame.parens.append(creator)
+            i += 1
+            continue
+
+        if tok == ")":
+            if not frame.parens:
+                sure = False
+                break
+            anonymous = frame.parens.pop() and i + 1 < n and tokens[i + 1] == "{"
+            i += 1
+            continue
+
+        if tok == ";":
+            if not frame.parens:
+                frame.reset()
+                frame.constants = False
+                frame.newpending = False
+            i += 1
+            continue
+
+        if tok in ('"', "'", "`", "#"):
+            sure = False
+
+        if tok == "new":
+            frame.newpending = True
+        elif tok == "[" and frame.newpending:
+            frame.newpending = False
+        elif tok in _TYPE_KEYWORDS and not frame.parens and (i == 0 or tokens[i - 1] != "."):
+            # record is only a keyword in "record Name(" or "record Name<"
+            if tok != "record" or (i + 2 < n and tokens[i + 2] in ("(", "<") and tokens[i + 1][0].isalpha()):
+                frame.pending = _TYPE_KEYWORDS[tok]
+        elif tok == "=" and not frame.parens:
+            frame.seenassign = True
+
+        if not frame.parens:
+            frame.prefix.append(tok)
+        i += 1
+
+    if len(stack) != 1:
+        sure = False
+    return imports, annotations, methods, sure
+
+
+# Imports, annotations and methods of a source file. The lexer result is
+# used unless it is unsure, javalang is then tried and its result kept when
+# it can parse the file. The cheap scan never calls javalang.
+def getfacts(source_file, cheap=False):
+    content = sources.readtext(source_file)
+    imports, annotations, methods, sure = scan(content)
+    if not sure and not cheap:
+        try:
+            tree = javalang.parse.parse(content)
+            return getimports(tree), getannotations(tree), getmethods(tree)
+        except Exception:
+            pass
+    return imports, annotations, methods
+
+
+
+_CHUNK = 1 << 20
+
+
+# Buffers over the bytes of a file, each ending on a line boundary so that
+# neither a line nor a URL is ever split between two of them. The file is
+# memory-mapped when possible (one buffer, no copy into Python strings),
+# otherwise read in fixed-size chunks carrying the unfinished last line over
+# to the next chunk. Peak memory does not depend on the size of the file.
+def _buffers(source):
+    # Blobs of a git revision and prefetched files are already in memory
+    if sources.inmemory(source):
+        yield sources.read(source)
+        return
+    with open(source, "rb") as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            mapped = None
+        if mapped is not None:
+            try:
+                yield mapped
+            finally:
+                mapped.close()
+            return
+
+        rest = b""
+        while True:
+            chunk = f.read(_CHUNK)
+            if not chunk:
+                if rest:
+                    yield rest
+                return
+            chunk = rest + chunk
+            cut = chunk.rfind(b"\n") + 1
+            if cut == 0:
+                rest = chunk
+                continue
+            rest = chunk[cut:]
+            yield chunk[:cut]
+
+
+# Lines of the buffer holding a match of the regex, each line once
+def _matchinglines(buf, regex):
+    last = -1
+    for match in regex.finditer(buf):
+        start = buf.rfind(b"\n", 0, match.start()) + 1
+        if start == last:
+            continue
+        last = start
+        end = buf.find(b"\n", match.end())
+        if end == -1:
+            end = len(buf)
+        yield buf[start:end].decode("utf-8", "replace")
+
+
+# Catalogs are read once per process, gethttpdb runs for every file
+@functools.lru_cache(maxsize=None)
+def readcatalog(path):
+    with open(path, "r") as catalog:
+        return tuple(line.strip() for line in catalog)
+
+
+# Lines that may hold a URL are found on the bytes, the URL regex then runs
+# on the decoded line so that \w keeps matching non-ASCII letters. URLs
+# never span lines : the regex matches no whitespace.
+_HTTP = re.compile(rb"https?:")
+
+
+def gethttpdb(source, cheap=False):
     urls = []
     db_statements = []
 
@@ -89,33 +348,38 @@ def gethttpdb(source):
     # HTTP Detection  #
     ###################
 
-    excluded_tlds = [line.strip() for line in open('tools/tlds.txt')]
+    excluded_tlds = readcatalog('tools/tlds.txt')
     httpregex = r"((https?):((//)|(\\\\))+([\w\d:#@%/;$()~_?\+-=\\\.&](#!)?)*)"
+    if cheap:
+        # Same URLs without the nested optional group, nothing to backtrack on
+        httpregex = r"((https?):((//)|(\\\\))+([\w\d:#@%/;$()~_?\+-=\\\.&!]*))"
 
-    matches = re.findall(httpregex, content)
-    if matches is not None:
-        for match in matches:
-            if any(ele in match[0] for ele in excluded_tlds) is False:
-                if len(match[0]) > 8:
-                    urls.append(match[0])
+    for buf in _buffers(source):
+        for line in _matchinglines(buf, _HTTP):
+            matches = re.findall(httpregex, line)
+            for match in matches:
+                if any(ele in match[0] for ele in excluded_tlds) is False:
+                    if len(match[0]) > 8:
+                        urls.append(match[0])
     return urls
 
 
+_MYSQL = re.compile(re.escape(b"mysql://"))
+_CREATE_DATABASE = re.compile(re.escape(b"create database"), re.IGNORECASE)
+
+
 def getdatasourceurls(source):
     ds_urls = []
-    with open(source, "r") as f:
-        content = f.read().splitlines()
-        for line in content:
-            if "mysql://" in line:
-                line = line.replace('"', " ").replace("'", " ").replace(",", " ")
-                ds_urls.append(line.split("mysql://")[1].split()[0])
+    for buf in _buffers(source):
+        for line in _matchinglines(buf, _MYSQL):
+            line = line.replace('"', " ").replace("'", " ").replace(",", " ")
+            ds_urls.append(line.split("mysql://")[1].split()[0])
     return list(set(ds_urls))
 
 def getcreatedbstatements(source):
     cdb_statements = []
-    with open(source, "r") as f:
-        content = f.read().splitlines()
-        for line in content:
+    for buf in _buffers(source):
+        for line in _matchinglines(buf, _CREATE_DATABASE):
             if "create database if not exists" in line.lower():
                 line = line.replace(";", " ")
                 print(line)
@@ -124,4 +388,4 @@ def getcreatedbstatements(source):
                 line = line.replace(";", " ")
                 print(line)
                 cdb_statements.append(line.lower().split("create database")[1].split()[0])
-    return list(set(cdb_statements))
\ No newline at end of file
+    return list(set(cdb_statements))
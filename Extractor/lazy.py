@@ -0,0 +1,20 @@
+import importlib.util
+import sys
+
+
+# Third-party modules that are slow to import (javalang, dockerfile_parse,
+# GitPython, PyYAML) are only imported when one of their attributes is first
+# used, so that short runs and library users only pay for what they use.
+#   javalang = lazy.load("javalang")
+def load(name):
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError("No module named " + repr(name), name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
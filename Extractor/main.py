@@ -1,94 +1,126 @@
 import os
 import json
+import importlib.util
+import argparse
+import callgraph
 import dependencies
+import descriptors
 import microservices
 import javaparser
 import dockerfiles
-import shutil
-
-
-mbsroot = "../CurrentMBS/Source"
-metamodel_file = "../metamodel.json"
-
-if os.path.exists(metamodel_file):
-    os.remove(metamodel_file)
-    
-shutil.copy("../blank_metamodel.json", metamodel_file)
-
-
-print("Thank you, excluding folders from analysis...")
-with open("../CurrentMBS/exclude.txt", "r") as excl:
-    excluded = excl.readlines()
-    excluded = [line.rstrip() for line in excluded]
-
-folders = [f.name for f in os.scandir(mbsroot) if f.is_dir()]
-
-print("Folders excluded, building meta-model...")
-print("Excluded folders : ")
-print("\n".join(excluded))
-
-mm_file = open(metamodel_file, "r")
-mm = json.load(mm_file)
-mm_file.close()
-
-
-mm["system"]["folders"] = folders
-
-##################################
-# Extracting system dependencies #
-##################################
-
-print("Extracting system wide dependencies")
-system_deps = dependencies.extract(mbsroot)
-print("Dependencies extracted, writing to meta-model")
-mm["system"]["dependencies"] = system_deps
-mm_file = open(metamodel_file, "w")
-json.dump(mm, mm_file)
-mm_file.close()
-print("Writing done")
-
-####################################
-# Extracting root config files     #
-####################################
-print("Extracting root configuration files")
-system_config = javaparser.getrootconfigfiles(mbsroot)
-print("")
-mm["system"]["config_files"] = system_config
-mm_file = open(metamodel_file, "w")
-json.dump(mm, mm_file)
-mm_file.close()
-print("Writing done")
-
-########################################
-# Extracting root hardcoded endpoints  #
-########################################
-
-mm["system"]["http"] = []
-for f in mm["system"]["config_files"]:
-    print("Extracting http for " + f)
-    http_root = javaparser.gethttpdb(f)
-    mm["system"]["http"] += http_root
-mm_file = open(metamodel_file, "w")
-json.dump(mm, mm_file)
-mm_file.close()
-print("Writing done")
-##################################
-# Extracting microservices       #
-##################################
-
-print("Extracting microservices")
-system_ms = microservices.extract(mbsroot)
-ms_node = []
-print("microservices extracted, reading information")
-for microservice in system_ms:
+import engine
+import manifests
+import metamodel
+import budget
+import pipeline
+import sampling
+import sources
+import traversal
+
+
+def fraction(value):
+    value = float(value)
+    if not 0 < value <= 1:
+        raise argparse.ArgumentTypeError("expected a fraction in ]0, 1], got " + repr(value))
+    return value
+
+
+def parsearguments(parser=None, argv=None):
+    if parser is None:
+        parser = argparse.ArgumentParser()
+    # A path ending with .mmb writes the compact binary metamodel
+    parser.add_argument("--metamodel", type=str, default="../metamodel.json")
+    # Files over these budgets are quarantined and only get a cheap scan
+    parser.add_argument("--max-file-bytes", type=int, default=budget.MAX_FILE_BYTES)
+    parser.add_argument("--max-file-seconds", type=float, default=budget.MAX_FILE_SECONDS)
+    # Processes parsing files, one per CPU by default
+    parser.add_argument("--jobs", type=int, default=None)
+    # Only parse this fraction of the source files of every service, sizes
+    # being estimated (see sampling.py)
+    parser.add_argument("--sample", type=fraction, default=None, metavar="FRACTION")
+    return parser.parse_args(argv)
+
+
+# The Detector class, Detector/main.py being loaded under another module name
+def loaddetector():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Detector", "main.py")
+    spec = importlib.util.spec_from_file_location("detector", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.Detector
+
+
+def blankmetamodel():
+    with open("../blank_metamodel.json", "r") as blank:
+        return json.load(blank)
+
+
+# Result of compute(path), taken from the per-file cache of the daemon when
+# there is one
+def filefacts(cache, stage, path, compute):
+    if cache is None:
+        return compute(path)
+    return cache.get(stage, path, compute)
+
+
+# Returns the lines of exclude.txt, also used to prune the walk of the system
+def extractfolders(mm, mbsroot):
+    print("Thank you, excluding folders from analysis...")
+    excluded = traversal.readlines("../CurrentMBS/exclude.txt")
+    traversal.settree(mbsroot, excluded)
+
+    folders = [name for name, isdir in sources.listdir(mbsroot) if isdir]
+
+    print("Folders excluded, building meta-model...")
+    print("Excluded folders : ")
+    print("\n".join(excluded))
+
+    mm["system"]["folders"] = folders
+    return excluded
+
+
+def extractrootconfig(mm, mbsroot):
+    print("Extracting root configuration files")
+    system_config = javaparser.getrootconfigfiles(mbsroot)
+    print("")
+    mm["system"]["config_files"] = system_config
+
+
+def extractroothttp(mm, quarantine, cache=None):
+    mm["system"]["http"] = []
+    for f in mm["system"]["config_files"]:
+        print("Extracting http for " + f)
+        http_root = filefacts(cache, "http", f, lambda p: pipeline.runstage(quarantine, "http", p))
+        mm["system"]["http"] += http_root
+
+
+# Compose files and Kubernetes manifests at the root of the system
+def extractrootdescriptors(mm, mbsroot, quarantine, cache=None):
+    mm["system"]["descriptors"] = []
+    for f in descriptors.getrootdescriptorfiles(mbsroot):
+        mm["system"]["descriptors"] += filefacts(cache, "descriptors", f,
+                                                 lambda p: pipeline.runstage(quarantine, "descriptors", p))
+
+
+# Without a pipeline, files are read and parsed one after the other. With a
+# sample fraction, only a sample of the source files is parsed and the sizes
+# are estimates.
+def extractservice(microservice, mbsroot, system_manifests, quarantine, cache=None, files_pipeline=None,
+                   sample=None):
     ms_data = {}
     service_path = mbsroot + "/" + microservice
-    cloc_out = microservices.getlocs(service_path)
     ms_data["name"] = microservice
-    ms_data["language"] = microservices.getlang(service_path)
-    ms_data["nb_files"] = cloc_out[0]  # The first returned value
-    ms_data["locs"] = cloc_out[3]  # The third returned value
-    ms_data["dependencies"] = dependencies.extract(service_path)
+    if sample is None:
+        cloc_out = microservices.getlocs(service_path)
+        ms_data["language"] = microservices.getlang(service_path)
+        ms_data["nb_files"] = cloc_out[0]  # The first returned value
+        ms_data["locs"] = cloc_out[3]  # The third returned value
+    else:
+        # enry and cloc read every file, sizes are estimated below
+        ms_data["language"] = microservices.guesslang(service_path)
+        ms_data["nb_files"] = ms_data["locs"] = None
+    ms_data["sample"] = None
+    ms_data["dependencies"] = dependencies.extract(service_path, system_manifests)
     ms_data["code"] = dict()
     ms_data["code"]["imports"] = []
     ms_data["code"]["annotations"] = []
@@ -100,50 +132,174 @@ for microservice in system_ms:
     ms_data["code"]["source_files"] = javaparser.getsourcefiles(service_path)
     ms_data["config"] = dict()
     ms_data["config"]["config_files"] = javaparser.getconfigfiles(service_path)
+    ms_data["config"]["ports"] = []
     ms_data["deployment"] = dict()
     ms_data["deployment"]["docker_files"] = dockerfiles.getdockerfiles(service_path)
     ms_data["deployment"]["images"] = []
+    ms_data["deployment"]["descriptors"] = []
     ms_data["env"] = dict()
     ms_data["env"]["env_files"] = javaparser.getenvfiles(service_path)
+    descriptor_files = descriptors.getdescriptorfiles(service_path)
+    source_files = ms_data["code"]["source_files"]
+    # Files of the other languages only give imports, annotations and methods
+    fact_files = source_files + engine.getsourcefiles(service_path)
+    if sample is not None:
+        strata = sampling.stratify(service_path, fact_files, sample)
+        counted = sampling.stratify(service_path, microservices.countedfiles(service_path), sample)
+        fact_files = sampling.sampled(strata)
+        java = set(source_files)
+        source_files = [f for f in fact_files if f in java]
+
+    # Every file is read and parsed once for all of its stages
+    httpdb_related = source_files + ms_data["config"]["config_files"] + ms_data["env"]["env_files"]
+    tasks = [(source, ["facts"]) for source in fact_files]
+    tasks += [(f, ["http", "datasources", "create"]) for f in httpdb_related]
+    tasks += [(f, ["descriptors"]) for f in descriptor_files]
+    tasks += [(f, ["ports"]) for f in ms_data["config"]["config_files"] + ms_data["env"]["env_files"]]
+    tasks += [(f, ["images"]) for f in ms_data["deployment"]["docker_files"]]
+    if sample is not None:
+        tasks += [(f, ["lines"]) for f in sampling.sampled(counted)]
+    if files_pipeline is None:
+        files_pipeline = pipeline.Pipeline(quarantine, jobs=1)
+    facts = files_pipeline.run(tasks, cache)
+
+    if sample is not None:
+        lines = dict((f, facts[("lines", f)][2]) for f in sampling.sampled(counted))
+        ms_data["sample"] = sampling.summary(strata, counted, sample, lines)
+        ms_data["nb_files"] = ms_data["sample"]["nb_files"]["estimate"]
+        ms_data["locs"] = ms_data["sample"]["locs"]["estimate"]
+
     # For every source file in this microservice
-    for source in ms_data["code"]["source_files"]:
-        # Build his AST tree
-        tree = javaparser.parse(source)
-        ms_data["code"]["annotations"] += javaparser.getannotations(tree)
-        ms_data["code"]["methods"] += javaparser.getmethods(tree)
-        ms_data["code"]["imports"] += javaparser.getimports(tree)
+    for source in fact_files:
+        # Extract his imports, annotations and methods
+        imports, annotations, methods = facts[("facts", source)]
+        ms_data["code"]["annotations"] += annotations
+        ms_data["code"]["methods"] += methods
+        ms_data["code"]["imports"] += imports
 
         # Removing potential duplicates
         ms_data["code"]["annotations"] = list(dict.fromkeys(ms_data["code"]["annotations"]))
         ms_data["code"]["methods"] = list(dict.fromkeys(ms_data["code"]["methods"]))
         ms_data["code"]["imports"] = list(dict.fromkeys(ms_data["code"]["imports"]))
 
-    httpdb_related = ms_data["code"]["source_files"] + ms_data["config"]["config_files"] + ms_data["env"]["env_files"]
     for f in httpdb_related:
-        http = javaparser.gethttpdb(f)
+        http = facts[("http", f)]
         ms_data["code"]["http"] += http
-        dbsources = javaparser.getdatasourceurls(f)
-        dbcreate = javaparser.getcreatedbstatements(f)
+        dbsources = facts[("datasources", f)]
+        dbcreate = facts[("create", f)]
         ms_data["code"]["databases"]["datasources"] += dbsources
         ms_data["code"]["databases"]["create"] += dbcreate
 
 
     for dockerfile in ms_data["deployment"]["docker_files"]:
-        parsed_dockerfile = dockerfiles.parse(dockerfile)
-        ms_data["deployment"]["images"].append(parsed_dockerfile.baseimage)
+        ms_data["deployment"]["images"].append(facts[("images", dockerfile)])
+
+    # Compose services and Kubernetes objects, read once here so that the
+    # Detector never goes back to the YAML files
+    for f in descriptor_files:
+        ms_data["deployment"]["descriptors"] += facts[("descriptors", f)]
+
+    # Ports the service listens on, to resolve calls to localhost
+    for f in ms_data["config"]["config_files"] + ms_data["env"]["env_files"]:
+        ms_data["config"]["ports"] += facts[("ports", f)]
+    ms_data["config"]["ports"] = list(dict.fromkeys(ms_data["config"]["ports"]))
+
+    return ms_data
+
+
+def run(args):
+    mbsroot = "../CurrentMBS/Source"
+    metamodel_file = args.metamodel
+
+    mm = blankmetamodel()
+    # Results of a sample are approximate, the Detector says so
+    if args.sample:
+        mm["system"]["sample"] = {"fraction": args.sample, "confidence": sampling.CONFIDENCE}
+    # A commit or tag is read straight from the object database of the clone,
+    # under a virtual root (repository@revision), nothing is checked out
+    if args.revision:
+        import gitsource
+        mbsroot, source = gitsource.mountrevision(args.repository, args.revision)
+        mm["system"]["revision"] = source.describe(mbsroot)
+    metamodel.dump(mm, metamodel_file, mbsroot)
+
+    quarantine = budget.Quarantine("../CurrentMBS/quarantine.txt", args.max_file_bytes, args.max_file_seconds)
+
+    excluded = extractfolders(mm, mbsroot)
+
+    ##################################
+    # Extracting system dependencies #
+    ##################################
+
+    print("Extracting system wide dependencies")
+    # Parent POMs and BOMs are resolved once for the root and every service
+    system_manifests = manifests.SystemManifests(mbsroot)
+    system_deps = dependencies.extract(mbsroot, system_manifests)
+    print("Dependencies extracted, writing to meta-model")
+    mm["system"]["dependencies"] = system_deps
+    metamodel.dump(mm, metamodel_file, mbsroot)
+    print("Writing done")
+
+    ####################################
+    # Extracting root config files     #
+    ####################################
+    extractrootconfig(mm, mbsroot)
+    metamodel.dump(mm, metamodel_file, mbsroot)
+    print("Writing done")
+
+    ########################################
+    # Extracting root hardcoded endpoints  #
+    ########################################
+
+    extractroothttp(mm, quarantine)
+    metamodel.dump(mm, metamodel_file, mbsroot)
+    print("Writing done")
+
+    ########################################
+    # Extracting root deployment files     #
+    ########################################
+
+    extractrootdescriptors(mm, mbsroot, quarantine)
+    metamodel.dump(mm, metamodel_file, mbsroot)
+    print("Writing done")
+    ##################################
+    # Extracting microservices       #
+    ##################################
+
+    print("Extracting microservices")
+    system_ms = microservices.extract(mbsroot, excluded)
+    ms_node = []
+    print("microservices extracted, reading information")
+    files_pipeline = pipeline.Pipeline(quarantine, args.jobs)
+    try:
+        for microservice in system_ms:
+            ms_node.append(extractservice(microservice, mbsroot, system_manifests, quarantine,
+                                          files_pipeline=files_pipeline, sample=args.sample))
+    finally:
+        files_pipeline.close()
+    print("{nb} files had the content of another one and were not parsed again".format(nb=files_pipeline.copies))
+
+
+    print("Writing microservices info into meta-model")
 
-    ms_node.append(ms_data)
+    mm["system"]["microservices"] = ms_node
+    mm["system"]["quarantine"] = quarantine.entries
+    # Hardcoded URLs resolved to the services they call
+    mm["system"]["calls"] = callgraph.extract(mm, mbsroot)
+    quarantine.save()
 
+    metamodel.dump(mm, metamodel_file, mbsroot)
+    print("Writing done")
 
-print("Writing microservices info into meta-model")
 
-mm_file = open(metamodel_file, "r")
-mm = json.load(mm_file)
-mm_file.close()
+# Entry point of both this script and "mars extract", paths being relative
+# to this folder
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog)
+    parser.add_argument("--repository", type=str, default="../CurrentMBS/Source")
+    parser.add_argument("--revision", type=str, default=None)
+    run(parsearguments(parser, argv))
 
-mm["system"]["microservices"] = ms_node
 
-mm_file = open(metamodel_file, "w")
-json.dump(mm, mm_file)
-mm_file.close()
-print("Writing done")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+import os
+import re
+import sources
+import traversal
+import xml.etree.ElementTree as ElementTree
+
+
+# Maven and Gradle manifests, parsed in-process : SystemManifests.analyse()
+# returns manifest records of the Maven platform, the one dependencies.extract
+# reads.
+#   [{"platform": "maven", "path": ..., "kind": "manifest", "success": True,
+#     "dependencies": [{"name": "group:artifact", "requirement": ..., "type": ...}]}]
+
+MANIFESTS = ("pom.xml", "build.gradle", "build.gradle.kts")
+
+
+##################################
+# Maven                          #
+##################################
+
+_PROPERTY = re.compile(r"\$\{([^}]+)\}")
+
+
+def _local(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def _child(node, name):
+    if node is None:
+        return None
+    for child in node:
+        if _local(child.tag) == name:
+            return child
+    return None
+
+
+def _text(node, name):
+    child = _child(node, name)
+    if child is None or child.text is None:
+        return None
+    return child.text.strip()
+
+
+def _children(node, *path):
+    nodes = [node]
+    for name in path:
+        nodes = [c for n in nodes if n is not None for c in n if _local(c.tag) == name]
+    return nodes
+
+
+def _resolve(value, properties):
+    # Properties may refer to other properties, bounded to avoid cycles
+    for _ in range(10):
+        if value is None or "${" not in value:
+            break
+        value = _PROPERTY.sub(lambda m: properties.get(m.group(1), m.group(0)), value)
+    return value
+
+
+def readpom(path):
+    return ElementTree.fromstring(sources.read(path))
+
+
+def pomproperties(project):
+    parent = _child(project, "parent")
+    properties = dict()
+    for prop in _children(project, "properties"):
+        for child in prop:
+            properties[_local(child.tag)] = (child.text or "").strip()
+    for field in ("groupId", "artifactId", "version"):
+        value = _text(project, field) or _text(parent, field)
+        if value is not None:
+            properties["project." + field] = value
+            properties["pom." + field] = value
+        if _text(parent, field) is not None:
+            properties["project.parent." + field] = _text(parent, field)
+    return properties
+
+
+def _rawdependency(node):
+    return dict((field, _text(node, field)) for field in ("groupId", "artifactId", "version", "scope", "type"))
+
+
+# Manifests of a whole system, each file read once. POMs get their effective
+# dependencies : parent POMs found in the system (relativePath or
+# coordinates) pass on their properties, dependencyManagement and
+# dependencies, and BOMs of the system imported in dependencyManagement pass
+# on their managed versions. Every resolution is memoized, so the root run
+# and the per-service runs of the Extractor share the same work.
+class SystemManifests(object):
+
+    def __init__(self, root):
+        self.root = os.path.normpath(root)
+        self._files = None
+        self._projects = dict()
+        self._errors = dict()
+        self._coordinates = None
+        self._effective = dict()
+        self._managed = dict()
+        self._dependencies = dict()
+        self._gradle = dict()
+
+    def files(self):
+        if self._files is None:
+            self._files = []
+            for manifest in MANIFESTS:
+                self._files += sorted(os.path.normpath(path) for path in traversal.find(self.root, [manifest]))
+        return self._files
+
+    def project(self, path):
+        if path not in self._projects:
+            try:
+                self._projects[path] = readpom(path)
+            except (ElementTree.ParseError, OSError) as e:
+                self._projects[path] = None
+                self._errors[path] = str(e)
+        return self._projects[path]
+
+    # (groupId, artifactId) -> path of every POM in the system
+    def coordinates(self):
+        if self._coordinates is None:
+            self._coordinates = dict()
+            for path in self.files():
+                project = self.project(path) if os.path.basename(path) == "pom.xml" else None
+                if project is not None:
+                    group = _text(project, "groupId") or _text(_child(project, "parent"), "groupId")
+                    self._coordinates.setdefault((group, _text(project, "artifactId")), path)
+        return self._coordinates
+
+    def parentpath(self, path, project):
+        parent = _child(project, "parent")
+        if parent is None:
+            return None
+        key = (_text(parent, "groupId"), _text(parent, "artifactId"))
+        relative = _text(parent, "relativePath")
+        if relative is None:
+            relative = "../pom.xml"
+        if relative:
+            candidate = os.path.normpath(os.path.join(os.path.dirname(path), relative))
+            if sources.isdir(candidate):
+                candidate = os.path.join(candidate, "pom.xml")
+            if sources.exists(candidate):
+                project = self.project(candidate)
+                if project is not None and (_text(project, "groupId") or _text(_child(project, "parent"), "groupId"),
+                                            _text(project, "artifactId")) == key:
+                    return candidate
+        return self.coordinates().get(key)
+
+    # Properties, managed and declared dependencies of a POM after parent
+    # inheritance, the last two still uninterpolated : a property set by a
+    # child applies to what it inherits
+    def effective(self, path):
+        if path in self._effective:
+            return self._effective[path]
+        # Placeholder against parent cycles
+        self._effective[path] = {"properties": dict(), "management": [], "dependencies": []}
+        project = self.project(path)
+        if project is None:
+            return self._effective[path]
+
+        parentpath = self.parentpath(path, project)
+        inherited = self.effective(parentpath) if parentpath is not None else self._effective[path]
+        properties = dict(inherited["properties"])
+        properties.update(pomproperties(project))
+        model = {
+            "properties": properties,
+            "management": inherited["management"] + [
+                _rawdependency(node) for node in _children(project, "dependencyManagement", "dependencies", "dependency")],
+            "dependencies": inherited["dependencies"] + [
+                _rawdependency(node) for node in _children(project, "dependencies", "dependency")]
+        }
+        self._effective[path] = model
+        return model
+
+    # (groupId, artifactId) -> {"version", "scope"} managed for a POM
+    def managed(self, path):
+        if path in self._managed:
+            return self._managed[path]
+        self._managed[path] = dict()
+        model = self.effective(path)
+        properties = model["properties"]
+        managed = dict()
+        for raw in model["management"]:
+            key = (_resolve(raw["groupId"], properties), _resolve(raw["artifactId"], properties))
+            scope = _resolve(raw["scope"], properties)
+            if scope == "import" and raw["type"] == "pom":
+                bom = self.coordinates().get(key)
+                if bom is not None:
+                    for imported, entry in self.managed(bom).items():
+                        managed.setdefault(imported, entry)
+                continue
+            managed[key] = {"version": _resolve(raw["version"], properties), "scope": scope}
+        self._managed[path] = managed
+        return managed
+
+    def pomdependencies(self, path):
+        if path in self._dependencies:
+            return self._dependencies[path]
+        properties = self.effective(path)["properties"]
+        managed = self.managed(path)
+        # A dependency redeclared by a child replaces the inherited one
+        dependencies = dict()
+        for raw in self.effective(path)["dependencies"]:
+            group = _resolve(raw["groupId"], properties)
+            artifact = _resolve(raw["artifactId"], properties)
+            if not group or not artifact:
+                continue
+            entry = managed.get((group, artifact), dict())
+            dependencies[(group, artifact)] = {
+                "name": group + ":" + artifact,
+                "requirement": _resolve(raw["version"], properties) or entry.get("version") or "*",
+                "type": _resolve(raw["scope"], properties) or entry.get("scope") or "runtime"
+            }
+        self._dependencies[path] = list(dependencies.values())
+        return self._dependencies[path]
+
+    def gradledependencies(self, path):
+        if path not in self._gradle:
+            try:
+                self._gradle[path] = parsegradle(path)
+            except (OSError, UnicodeDecodeError) as e:
+                self._gradle[path] = []
+                self._errors[path] = str(e)
+        return self._gradle[path]
+
+    # Manifest records of the files under path, which is the system root or
+    # one of its folders
+    def analyse(self, path):
+        path = os.path.normpath(path)
+        records = []
+        for manifest in self.files():
+            if manifest != path and not manifest.startswith(path + os.sep):
+                continue
+            if os.path.basename(manifest) == "pom.xml":
+                dependencies = self.pomdependencies(manifest)
+            else:
+                dependencies = self.gradledependencies(manifest)
+            record = {
+                "platform": "maven",
+                "path": os.path.relpath(manifest, path),
+                "kind": "manifest",
+                "success": manifest not in self._errors,
+                "dependencies": dependencies
+            }
+            if manifest in self._errors:
+                record["error_message"] = self._errors[manifest]
+            records.append(record)
+        return records
+
+
+##################################
+# Gradle (Groovy and Kotlin DSL) #
+##################################
+
+# Strings are kept whole so that "http://" or "${version}" are never taken
+# for a comment or a brace
+_GRADLE_TOKEN = re.compile(r'("""(?:.|\n)*?"""|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\')|//[^\n]*|/\*(?:.|\n)*?\*/')
+
+# implementation "group:name:version", compile('group:name'), api(platform("g:n:v"))...
+_GRADLE_STRING_DEP = re.compile(
+    r'\b([A-Za-z]\w*)\s*\(?\s*(?:(?:enforcedPlatform|platform)\s*\(\s*)?'
+    r'["\']([\w.\-]+):([\w.\-]+)(?::([^"\'\s:@]*))?[^"\']*["\']')
+
+# compile group: 'g', name: 'n', version: 'v' or implementation(group = "g", name = "n", version = "v")
+_GRADLE_MAP_DEP = re.compile(
+    r'\b([A-Za-z]\w*)\s*\(?\s*group\s*[:=]\s*["\']([^"\']+)["\']\s*,\s*'
+    r'name\s*[:=]\s*["\']([^"\']+)["\']'
+    r'(?:\s*,\s*version\s*[:=]\s*["\']([^"\']*)["\'])?')
+
+
+def _stripcomments(text):
+    return _GRADLE_TOKEN.sub(lambda m: m.group(1) or "", text)
+
+
+# Contents of every `dependencies { ... }` block (buildscript, subprojects...)
+def _dependencyblocks(text):
+    masked = _GRADLE_TOKEN.sub(lambda m: "\"" + " " * (len(m.group(0)) - 2) + "\"" if m.group(1) else m.group(0), text)
+    blocks = []
+    for match in re.finditer(r"\bdependencies\s*\{", masked):
+        depth = 0
+        for i in range(match.end() - 1, len(masked)):
+            if masked[i] == "{":
+                depth += 1
+            elif masked[i] == "}":
+                depth -= 1
+                if depth == 0:
+                    blocks.append(text[match.end():i])
+                    break
+    return blocks
+
+
+def parsegradle(path):
+    text = _stripcomments(sources.readtext(path))
+    dependencies = []
+    for block in _dependencyblocks(text):
+        found = []
+        for regex in (_GRADLE_STRING_DEP, _GRADLE_MAP_DEP):
+            for match in regex.finditer(block):
+                found.append((match.start(), match.groups()))
+        # Declaration order, whichever notation is used
+        for start, (configuration, group, name, version) in sorted(found):
+            dependencies.append({
+                "name": group + ":" + name,
+                "requirement": version or "*",
+                "type": configuration
+            })
+    return dependencies
@@ -0,0 +1,454 @@
+import json
+import os
+import re
+import struct
+import sys
+import zlib
+
+
+# Compact metamodel encoding (".mmb")
+#
+# The file starts with MAGIC followed by a zlib stream holding the path root
+# and one tagged value, the same tree as the JSON metamodel. Strings are
+# interned : a string is written once (_NEW) the first time it is seen and
+# every later occurrence is a varint index into the table (_REF). Strings that
+# start with the path root are stored relative to it. Lists made only of
+# strings (imports, methods, files...) are written as packed uint32 indexes.
+
+MAGIC = b"MARSMM\x01"
+BINARY_EXTENSION = ".mmb"
+
+_NONE = b"N"
+_FALSE = b"F"
+_TRUE = b"T"
+_INT = b"I"
+_FLOAT = b"D"
+_NEW = b"S"
+_REF = b"R"
+_LIST = b"L"
+_DICT = b"M"
+_STRLIST = b"A"
+
+_CHUNK = 1 << 16
+
+
+def isbinary(path):
+    if path.endswith(BINARY_EXTENSION):
+        return True
+    if not os.path.isfile(path):
+        return False
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def load(path):
+    if not isbinary(path):
+        with open(path, "r") as f:
+            return json.load(f)
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(path + " is not a binary metamodel")
+        return loads(f.read())
+
+
+# Reads the metamodel one microservice at a time : yields (key, value) for
+# every system field and ("microservices", service) for every microservice, in
+# file order, without ever holding the whole metamodel in memory
+def stream(path):
+    if isbinary(path):
+        return _streambinary(path)
+    return _streamjson(path)
+
+
+def dump(mm, path, root=None):
+    if not path.endswith(BINARY_EXTENSION):
+        with open(path, "w") as f:
+            json.dump(mm, f)
+        return
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(dumps(mm, root))
+
+
+def dumps(mm, root=None):
+    if root is None:
+        root = guessroot(mm)
+    writer = _Writer(root)
+    writer.value(mm)
+    return zlib.compress(bytes(writer.out))
+
+
+def loads(data):
+    reader = _Reader(zlib.decompress(data))
+    return reader.value()
+
+
+# Longest directory shared by every file path of the metamodel
+def guessroot(mm):
+    paths = []
+    system = mm.get("system", {})
+    paths += system.get("config_files", [])
+    for service in system.get("microservices", []):
+        paths += service.get("code", {}).get("source_files", [])
+        paths += service.get("config", {}).get("config_files", [])
+        paths += service.get("deployment", {}).get("docker_files", [])
+        paths += service.get("env", {}).get("env_files", [])
+    paths = [p for p in paths if isinstance(p, str) and "/" in p]
+    if not paths:
+        return ""
+    try:
+        root = os.path.commonpath([os.path.dirname(p) for p in paths])
+    except ValueError:
+        return ""
+    # commonpath normalises, only keep the root if the raw paths really share it
+    if all(p.startswith(root + "/") for p in paths):
+        return root
+    return ""
+
+
+##################################
+# Encoding                       #
+##################################
+
+def _varint(out, n):
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+class _Writer(object):
+
+    def __init__(self, root):
+        self.out = bytearray()
+        self.table = dict()
+        self.root = root
+        self.prefix = root + "/" if root else None
+        self.newstring(root)
+
+    def newstring(self, s):
+        self.table[s] = len(self.table)
+        relative = self.prefix is not None and s.startswith(self.prefix)
+        raw = (s[len(self.prefix):] if relative else s).encode("utf-8")
+        _varint(self.out, (len(raw) << 1) | relative)
+        self.out += raw
+
+    def string(self, s):
+        idx = self.table.get(s)
+        if idx is None:
+            self.out += _NEW
+            self.newstring(s)
+        else:
+            self.out += _REF
+            _varint(self.out, idx)
+
+    def value(self, v):
+        out = self.out
+        if v is None:
+            out += _NONE
+        elif v is True:
+            out += _TRUE
+        elif v is False:
+            out += _FALSE
+        elif isinstance(v, str):
+            self.string(v)
+        elif isinstance(v, int):
+            out += _INT
+            _varint(out, (v << 1) if v >= 0 else ((-v << 1) - 1))
+        elif isinstance(v, float):
+            out += _FLOAT
+            out += struct.pack("<d", v)
+        elif isinstance(v, dict):
+            out += _DICT
+            _varint(out, len(v))
+            for k, item in v.items():
+                self.string(k)
+                self.value(item)
+        elif isinstance(v, (list, tuple)):
+            if not (v and all(type(item) is str for item in v) and self.strlist(v)):
+                out += _LIST
+                _varint(out, len(v))
+                for item in v:
+                    self.value(item)
+        else:
+            raise TypeError("Cannot encode " + type(v).__name__ + " in metamodel")
+
+    # The new strings of a list are written as one NUL separated block, a
+    # leading \x01 marking the relative ones, so the reader splits them in C.
+    # Lists holding strings that would clash with this are written item by item
+    def strlist(self, v):
+        new = [s for s in dict.fromkeys(v) if s not in self.table]
+        if any("\x00" in s or s.startswith("\x01") for s in new):
+            return False
+        self.out += _STRLIST
+        _varint(self.out, len(new))
+        if new:
+            prefix = self.prefix
+            block = []
+            for s in new:
+                self.table[s] = len(self.table)
+                if prefix is not None and s.startswith(prefix):
+                    s = "\x01" + s[len(prefix):]
+                block.append(s)
+            raw = "\x00".join(block).encode("utf-8")
+            _varint(self.out, len(raw))
+            self.out += raw
+        _varint(self.out, len(v))
+        self.out += struct.pack("<%dI" % len(v), *[self.table[s] for s in v])
+        return True
+
+
+##################################
+# Decoding                       #
+##################################
+
+class _Reader(object):
+
+    # `source` is either the whole decoded payload or a callable returning
+    # the next chunk of it (b"" at the end), used when streaming
+    def __init__(self, source):
+        if callable(source):
+            self.buf = b""
+            self.more = source
+        else:
+            self.buf = source
+            self.more = None
+        self.pos = 0
+        self.table = []
+        self.prefix = ""
+        self.root = self.newstring()
+        self.prefix = self.root + "/" if self.root else ""
+
+    def need(self, n):
+        if self.pos + n <= len(self.buf) or self.more is None:
+            return
+        parts = [self.buf[self.pos:]]
+        size = len(parts[0])
+        while size < n:
+            chunk = self.more()
+            if not chunk:
+                break
+            parts.append(chunk)
+            size += len(chunk)
+        self.buf = b"".join(parts)
+        self.pos = 0
+
+    def read(self, n):
+        pos = self.pos
+        if pos + n > len(self.buf):
+            self.need(n)
+            pos = self.pos
+        data = self.buf[pos:pos + n]
+        if len(data) < n:
+            raise ValueError("Truncated metamodel")
+        self.pos = pos + n
+        return data
+
+    def varint(self):
+        if self.pos + 10 > len(self.buf):
+            self.need(10)
+        buf = self.buf
+        pos = self.pos
+        try:
+            b = buf[pos]
+            n = b & 0x7F
+            shift = 7
+            while b & 0x80:
+                pos += 1
+                b = buf[pos]
+                n |= (b & 0x7F) << shift
+                shift += 7
+        except IndexError:
+            raise ValueError("Truncated metamodel")
+        self.pos = pos + 1
+        return n
+
+    def newstring(self):
+        header = self.varint()
+        s = self.read(header >> 1).decode("utf-8")
+        if header & 1:
+            s = self.prefix + s
+        self.table.append(s)
+        return s
+
+    def value(self):
+        tag = self.read(1)
+        if tag == _REF:
+            return self.table[self.varint()]
+        if tag == _NEW:
+            return self.newstring()
+        if tag == _STRLIST:
+            return self.strlist()
+        if tag == _DICT:
+            n = self.varint()
+            d = dict()
+            for _ in range(n):
+                k = self.value()
+                d[k] = self.value()
+            return d
+        if tag == _LIST:
+            return [self.value() for _ in range(self.varint())]
+        if tag == _INT:
+            n = self.varint()
+            return (n >> 1) if not n & 1 else -((n + 1) >> 1)
+        if tag == _FLOAT:
+            return struct.unpack("<d", self.read(8))[0]
+        if tag == _NONE:
+            return None
+        if tag == _TRUE:
+            return True
+        if tag == _FALSE:
+            return False
+        raise ValueError("Unknown metamodel tag " + repr(tag))
+
+    def strlist(self):
+        if self.varint():
+            block = "\x00" + self.read(self.varint()).decode("utf-8")
+            block = block.replace("\x00\x01", "\x00" + self.prefix)
+            self.table += block.split("\x00")[1:]
+        n = self.varint()
+        table = self.table
+        return [table[i] for i in struct.unpack("<%dI" % n, self.read(4 * n))]
+
+
+##################################
+# Streaming                      #
+##################################
+
+def _streambinary(path):
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(path + " is not a binary metamodel")
+        inflater = zlib.decompressobj()
+
+        def more():
+            while True:
+                data = f.read(_CHUNK)
+                if not data:
+                    return inflater.flush()
+                chunk = inflater.decompress(data)
+                if chunk:
+                    return chunk
+
+        reader = _Reader(more)
+        for key in _binarykeys(reader):
+            if key != "system":
+                reader.value()
+                continue
+            for field in _binarykeys(reader):
+                if field == "microservices" and reader.read(1) == _LIST:
+                    for _ in range(reader.varint()):
+                        yield field, reader.value()
+                elif field == "microservices":
+                    # Only the empty list is not written as _LIST
+                    reader.pos -= 1
+                    for service in reader.value():
+                        yield field, service
+                else:
+                    yield field, reader.value()
+
+
+def _binarykeys(reader):
+    if reader.read(1) != _DICT:
+        raise ValueError("Malformed metamodel")
+    for _ in range(reader.varint()):
+        yield reader.value()
+
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def _streamjson(path):
+    with open(path, "r") as f:
+        parser = _JsonStream(f)
+        parser.expect("{")
+        for key in parser.keys():
+            if key != "system":
+                parser.value()
+                continue
+            parser.expect("{")
+            for field in parser.keys():
+                if field != "microservices":
+                    yield field, parser.value()
+                    continue
+                parser.expect("[")
+                if parser.peek() == "]":
+                    parser.expect("]")
+                    continue
+                while True:
+                    yield field, parser.value()
+                    if parser.expect(",]") == "]":
+                        break
+
+
+# Minimal pull parser over a JSON file : the structure around the
+# microservices list is walked by hand, every value is decoded by the C
+# decoder from a buffer holding little more than that value
+class _JsonStream(object):
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self, size=_CHUNK):
+        data = self.f.read(size)
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                raise ValueError("Truncated metamodel")
+
+    def expect(self, chars):
+        c = self.peek()
+        if c not in chars:
+            raise ValueError("Malformed metamodel, expected " + chars + " got " + c)
+        self.pos += 1
+        return c
+
+    def keys(self):
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            if self.expect(",}") == "}":
+                return
+
+    def value(self):
+        self.peek()
+        size = _CHUNK
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # A number ending the buffer might continue in the next chunk
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill(size)
+            size *= 2
+
+
+# Converting between both encodings :
+#   python metamodel.py ../metamodel.json ../metamodel.mmb
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage : python metamodel.py INPUT OUTPUT")
+        sys.exit(1)
+    dump(load(sys.argv[1]), sys.argv[2])
@@ -1,23 +1,94 @@
-import glob
 import os
 import re
+import sources
+import tempfile
+import traversal
 
-def extract(root):
+# excluded : lines of exclude.txt, read from next to the root when not given
+def extract(root, excluded=None):
     microservices = []
     print(root)
-    rootpath = root.split("Source")[0]
-    exclude_file = open(rootpath + "/exclude.txt", 'r')
-    excluded_services = exclude_file.read().split()
-    all_services = glob.glob(root + "/*/")
-    for service in all_services:
-        ms_name = service.split("/")[-2]
-        if ms_name not in excluded_services:
+    if excluded is None:
+        rootpath = root.split("Source")[0]
+        excluded = traversal.readlines(rootpath + "/exclude.txt")
+    all_services = [name for name, isdir in sources.listdir(root) if isdir and not name.startswith(".")]
+    for ms_name in all_services:
+        if not traversal.isexcluded(excluded, ms_name):
             microservices.append(ms_name)
 
     return microservices
 
 
+# Services of a git revision have no files on disk for enry and cloc, their
+# language and line counts are computed here
+_EXTENSIONS = {
+    "java": "java", "kt": "kotlin", "scala": "scala", "groovy": "groovy", "go": "go", "py": "python",
+    "js": "javascript", "ts": "typescript", "cs": "c#", "rb": "ruby", "php": "php", "c": "c", "cpp": "c++"
+}
+
+
+# Language holding the most bytes of code, as enry reports it
+def guesslang(service):
+    sizes = dict()
+    for path in traversal.find(service, ["*." + extension for extension in _EXTENSIONS]):
+        language = _EXTENSIONS[path.rsplit(".", 1)[1]]
+        sizes[language] = sizes.get(language, 0) + sources.getsize(path)
+    if not sizes:
+        return "unknown"
+    return max(sizes, key=sizes.get)
+
+
+# Blank, comment and code lines of a file, blobs being kept by id
+_linecounts = dict()
+
+
+def countfilelines(path):
+    stamp = sources.stamp(path)
+    if not sources.ismounted(path):
+        stamp = (path, stamp)
+    if stamp not in _linecounts:
+        blank = comment = code = 0
+        incomment = False
+        for line in sources.readtext(path).splitlines():
+            line = line.strip()
+            if incomment:
+                comment += 1
+                incomment = "*/" not in line
+            elif not line:
+                blank += 1
+            elif line.startswith("//"):
+                comment += 1
+            elif line.startswith("/*"):
+                comment += 1
+                incomment = "*/" not in line[2:]
+            else:
+                code += 1
+        _linecounts[stamp] = (blank, comment, code)
+    return _linecounts[stamp]
+
+
+# Files cloc is asked to count
+def countedfiles(service):
+    return traversal.find(service, ["*.java"])
+
+
+# Java files, blank, comment and code lines, in the order of the cloc output
+def countlines(service):
+    files = countedfiles(service)
+    blank = comment = code = 0
+    for path in files:
+        counts = countfilelines(path)
+        blank += counts[0]
+        comment += counts[1]
+        code += counts[2]
+    if not files:
+        return [1, 1, 1, 1]
+    return [str(len(files)), str(blank), str(comment), str(code)]
+
+
 def getlang(service):
+    if sources.ismounted(service):
+        return guesslang(service)
     enry = os.popen("./enry " + service)
     toplang = enry.read()
     if toplang:
@@ -27,8 +98,17 @@ def getlang(service):
 
 
 def getlocs(service):
-    cloc = os.popen("cloc " + service)
-    output = cloc.read()
+    if sources.ismounted(service):
+        return countlines(service)
+    # Build outputs are not counted, as they are not walked : dependency
+    # folders are excluded by name, build outputs by path as a "build"
+    # package has to be counted
+    with tempfile.NamedTemporaryFile("w", suffix=".txt") as outputs:
+        outputs.write("\n".join(os.path.abspath(output) for output in traversal.outputs(service)))
+        outputs.flush()
+        cloc = os.popen("cloc --exclude-dir=" + ",".join(traversal.excludeddirs())
+                        + " --exclude-list-file=" + outputs.name + " " + service)
+        output = cloc.read()
     values = [1, 1, 1, 1]
     if "-----" in output:
         lines = output.splitlines()
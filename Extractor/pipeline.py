@@ -0,0 +1,257 @@
+import concurrent.futures
+import functools
+import hashlib
+import os
+import queue
+import threading
+import budget
+import configuration
+import descriptors
+import dockerfiles
+import engine
+import javaparser
+import microservices
+import sources
+
+
+# Per-file stages of the Extractor as a pipeline : the files of a service are
+# read by a few threads (prefetch), parsed and scanned by a pool of processes,
+# and the results gathered in the order the files were found. Bounded queues
+# between the stages keep a fixed number of files in memory, the readers wait
+# when the parsers fall behind and the other way round, so reads overlap
+# with parsing.
+#   discover (main.py) -> read (threads) -> parse (processes) -> aggregate
+#
+# Files are hashed as they are read : a content already seen in the run, in
+# this service or another one (generated clients, DTOs, templates copied
+# around), is not parsed again, its results are shared with every copy.
+
+# name -> (stage, cheap scan, result when skipped). Stages without a cheap
+# scan run outside the per-file budgets.
+STAGES = {
+    "facts": (engine.getfacts, functools.partial(engine.getfacts, cheap=True), ([], [], [])),
+    "http": (javaparser.gethttpdb, functools.partial(javaparser.gethttpdb, cheap=True), []),
+    "datasources": (javaparser.getdatasourceurls, None, None),
+    "create": (javaparser.getcreatedbstatements, None, None),
+    "descriptors": (descriptors.parse, lambda path: [], []),
+    "ports": (configuration.getports, None, None),
+    "lines": (microservices.countfilelines, None, None),
+    "images": (dockerfiles.getbaseimage, None, None)
+}
+
+# Stages whose results name the file, never shared between copies
+BY_PATH = ("descriptors",)
+
+READERS = 4
+QUEUE_SIZE = 64
+# Results kept for later copies, the oldest being dropped first
+MAX_SHARED = 1 << 18
+
+
+def runstage(quarantine, name, path):
+    stage, cheap, skipped = STAGES[name]
+    if cheap is None:
+        return stage(path)
+    return quarantine.run(name, path, stage, cheap, skipped)
+
+
+def digest(data):
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+# Stages give the same results for the same bytes in files of the same type
+def contentkey(name, path, content):
+    if name in BY_PATH or content is None:
+        return None
+    return name, engine.extension(path), content
+
+
+##################################
+# Parser processes               #
+##################################
+
+_quarantine = None
+
+
+def _initworker(max_bytes, max_seconds, previous):
+    global _quarantine
+    _quarantine = budget.Quarantine(os.devnull, max_bytes, max_seconds)
+    _quarantine.previous = previous
+
+
+# Results of the stages on one file, and the quarantine entries they added.
+# data is None when the file was not prefetched : it is then read here.
+def _work(path, data, names):
+    if data is not None:
+        sources.load(path, data)
+    try:
+        results = [runstage(_quarantine, name, path) for name in names]
+    finally:
+        sources.release(path)
+    entries = _quarantine.entries
+    _quarantine.entries = []
+    return results, entries
+
+
+##################################
+# Pipeline                       #
+##################################
+
+class Pipeline(object):
+
+    # jobs parser processes (one per CPU by default), 1 runs every stage in
+    # this process, one file after the other
+    def __init__(self, quarantine, jobs=None, readers=READERS, queue_size=QUEUE_SIZE):
+        self.quarantine = quarantine
+        self.jobs = jobs or os.cpu_count() or 1
+        self.readers = readers
+        self.queue_size = queue_size
+        self.pool = None
+        self.shared = dict()    # content key -> (first file, result)
+        self.copies = 0         # files not parsed again
+        if self.jobs > 1:
+            self.pool = concurrent.futures.ProcessPoolExecutor(
+                self.jobs, initializer=_initworker,
+                initargs=(quarantine.max_bytes, quarantine.max_seconds, quarantine.previous))
+            # Workers are started now, before any reader thread exists
+            self.pool.submit(int).result()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    # tasks : [(path, [stage names])]. Returns (stage name, path) -> result,
+    # results kept in the cache, or of a file with the same content, being
+    # reused.
+    def run(self, tasks, cache=None):
+        results = dict()
+        # path -> stages left to run, a file listed twice is read once
+        merged = dict()
+        for path, names in tasks:
+            for name in names:
+                if (name, path) in results or name in merged.get(path, ()):
+                    continue
+                found, value = cache.lookup(name, path) if cache is not None else (False, None)
+                if found:
+                    results[(name, path)] = value
+                else:
+                    merged.setdefault(path, []).append(name)
+
+        # Copies of a file parsed in this run wait for its results
+        claimed = dict()   # content key -> first file
+        copies = []        # (stage name, path, content key)
+
+        def select(path, content):
+            todo = []
+            for name in merged[path]:
+                key = contentkey(name, path, content)
+                if key is not None and (key in self.shared or key in claimed):
+                    copies.append((name, path, key))
+                    continue
+                if key is not None:
+                    claimed[key] = path
+                todo.append(name)
+            return todo
+
+        files = self._sequential if self.pool is None else self._parallel
+        for path, names, values in files(list(merged), select):
+            results.update(((name, path), value) for name, value in zip(names, values))
+
+        for name, path, key in copies:
+            if key in claimed:
+                original, value = claimed[key], results[(name, claimed[key])]
+            else:
+                original, value = self.shared[key]
+            results[(name, path)] = value
+            self.copyquarantine(name, original, path)
+        self.copies += len(set(path for name, path, key in copies))
+        for key, path in claimed.items():
+            self.share(key, path, results[(key[0], path)])
+
+        if cache is not None:
+            for path, names in merged.items():
+                for name in names:
+                    cache.store(name, path, results[(name, path)])
+        return results
+
+    def share(self, key, path, value):
+        if len(self.shared) >= MAX_SHARED:
+            del self.shared[next(iter(self.shared))]
+        self.shared[key] = (path, value)
+
+    # A copy of a quarantined file is listed too
+    def copyquarantine(self, name, original, path):
+        for entry in [e for e in self.quarantine.entries if e["file"] == original and e["stage"] == name]:
+            self.quarantine.add(path, name, entry["reason"], entry["action"])
+
+    # Files too big for the byte budget are not prefetched, they go to their
+    # cheap scan which reads them itself
+    def _read(self, path):
+        try:
+            if sources.ismounted(path) or sources.getsize(path) <= self.quarantine.max_bytes:
+                return sources.read(path)
+        except OSError:
+            pass
+        return None
+
+    # (path, stages run, results) for every file, select(path, content hash)
+    # giving the stages to run
+    def _sequential(self, files, select):
+        for path in files:
+            data = self._read(path)
+            names = select(path, digest(data) if data is not None else None)
+            if data is not None:
+                sources.load(path, data)
+            try:
+                values = [runstage(self.quarantine, name, path) for name in names]
+            finally:
+                sources.release(path)
+            yield path, names, values
+
+    def _parallel(self, files, select):
+        todo = queue.Queue()
+        for path in files:
+            todo.put(path)
+        loaded = queue.Queue(self.queue_size)
+
+        # Hashed by the readers, the GIL being released on big buffers. Any
+        # error is handed to the main thread, which would otherwise wait for
+        # the file forever.
+        def reader():
+            while True:
+                try:
+                    path = todo.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    data = self._read(path)
+                    loaded.put((path, data, digest(data) if data is not None else None, None))
+                except BaseException as error:
+                    loaded.put((path, None, None, error))
+                    return
+
+        readers = [threading.Thread(target=reader, daemon=True) for _ in range(min(self.readers, len(files)))]
+        for thread in readers:
+            thread.start()
+
+        # Files sent to the parsers and not parsed yet, at most queue_size
+        slots = threading.BoundedSemaphore(self.queue_size)
+        futures = []
+        for _ in range(len(files)):
+            path, data, content, error = loaded.get()
+            if error is not None:
+                raise error
+            names = select(path, content)
+            if not names:
+                continue
+            slots.acquire()
+            future = self.pool.submit(_work, path, data, names)
+            future.add_done_callback(lambda f: slots.release())
+            futures.append((path, names, future))
+
+        for path, names, future in futures:
+            values, entries = future.result()
+            for entry in entries:
+                self.quarantine.add(entry["file"], entry["stage"], entry["reason"], entry["action"])
+            yield path, names, values
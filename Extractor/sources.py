@@ -0,0 +1,117 @@
+import io
+import os
+
+
+# Where the Extractor reads files from : the working tree, or the blobs of a
+# git revision mounted on a virtual root (see gitsource.py). Paths under a
+# mounted root are answered by its source, any other path by the file system.
+_mounts = dict()
+
+# Contents already read by the pipeline (see pipeline.py), path -> bytes
+_loaded = dict()
+
+
+def mount(root, source):
+    _mounts[root] = source
+
+
+def unmount(root):
+    _mounts.pop(root, None)
+
+
+def _lookup(path):
+    for root, source in _mounts.items():
+        if path == root:
+            return source, ""
+        if path.startswith(root + "/"):
+            return source, path[len(root) + 1:]
+    return None, path
+
+
+def ismounted(path):
+    return _lookup(path)[0] is not None
+
+
+def load(path, data):
+    _loaded[path] = data
+
+
+def release(path):
+    _loaded.pop(path, None)
+
+
+# The content is already in memory, there is nothing to map
+def inmemory(path):
+    return path in _loaded or ismounted(path)
+
+
+def read(path):
+    if path in _loaded:
+        return _loaded[path]
+    source, relpath = _lookup(path)
+    if source is not None:
+        return source.read(relpath)
+    with open(path, "rb") as f:
+        return f.read()
+
+
+# Same text as open(path, "r").read() : default encoding, universal newlines
+def readtext(path):
+    if path in _loaded:
+        return io.TextIOWrapper(io.BytesIO(_loaded[path])).read()
+    source, relpath = _lookup(path)
+    if source is not None:
+        return io.TextIOWrapper(io.BytesIO(source.read(relpath))).read()
+    with open(path, "r") as f:
+        return f.read()
+
+
+# [(name, is a folder)] in listing order
+def listdir(path, follow_symlinks=True):
+    source, relpath = _lookup(path)
+    if source is not None:
+        return source.listdir(relpath)
+    return [(entry.name, entry.is_dir(follow_symlinks=follow_symlinks)) for entry in os.scandir(path)]
+
+
+# Binary file object, for parsers reading a stream
+def openbinary(path):
+    if path in _loaded:
+        return io.BytesIO(_loaded[path])
+    source, relpath = _lookup(path)
+    if source is not None:
+        return io.BytesIO(source.read(relpath))
+    return open(path, "rb")
+
+
+def exists(path):
+    source, relpath = _lookup(path)
+    if source is not None:
+        return source.exists(relpath)
+    return os.path.exists(path)
+
+
+def isdir(path):
+    source, relpath = _lookup(path)
+    if source is not None:
+        return source.isdir(relpath)
+    return os.path.isdir(path)
+
+
+def getsize(path):
+    if path in _loaded:
+        return len(_loaded[path])
+    source, relpath = _lookup(path)
+    if source is not None:
+        return source.getsize(relpath)
+    return os.path.getsize(path)
+
+
+# Changes whenever the content may have changed : modification time and
+# size on disk, blob id in git
+def stamp(path):
+    source, relpath = _lookup(path)
+    if source is not None:
+        return source.stamp(relpath)
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
@@ -0,0 +1,32 @@
+import os
+import tempfile
+import unittest
+import configuration
+
+
+class GetPortsTest(unittest.TestCase):
+
+    def write(self, name, data):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        path = os.path.join(folder.name, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    # .properties files are Latin-1 by spec
+    def test_latin1_properties(self):
+        path = self.write("application.properties", "app.name=caf\xe9\nserver.port = 8081\n".encode("latin-1"))
+        self.assertEqual(configuration.getports(path), [8081])
+
+    def test_env_file(self):
+        path = self.write(".env", b"PORT=3000\nSERVER_PORT='8082'\n")
+        self.assertEqual(configuration.getports(path), [3000, 8082])
+
+    def test_yaml(self):
+        path = self.write("application.yml", b"server:\n  port: 9090\n")
+        self.assertEqual(configuration.getports(path), [9090])
+
+
+if __name__ == "__main__":
+    unittest.main()
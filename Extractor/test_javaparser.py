@@ -0,0 +1,134 @@
+import os
+import re
+import tempfile
+import unittest
+import javalang
+import javaparser
+
+
+# The lexer (javaparser.scan) against javalang on fixed sources. javalang
+# 0.13 predates text blocks and records : text blocks are compared with the
+# same source using plain strings, records with the facts javalang would give.
+
+GENERICS = '''package a;
+import java.util.*;
+import static java.util.Map.Entry;
+public class Repo<T extends Comparable<? super T>, K> {
+    private Map<String, List<Map<K, T>>> index = new HashMap<>();
+    public <R extends T> List<? extends R> find(Map<K, List<R>> m, Class<R>[] types) { return null; }
+    static <A, B> Map.Entry<A, B> pair(A a, B b) { return null; }
+    public Repo() { }
+    List<int[]>[] arrays() { return null; }
+}
+'''
+
+ANNOTATIONS = '''import org.springframework.web.bind.annotation.*;
+@RestController
+@RequestMapping(value = {"/orders", "/o"}, produces = "application/json")
+public class OrderController {
+    @Autowired(required = false) private Service service;
+    @GetMapping(path = "/{id}", params = {"a=1"})
+    @org.acme.Timed(value = @Meta(name = "x"), percentiles = {0.5, 0.99})
+    public Order get(@PathVariable("id") long id, @RequestParam(defaultValue = "{}") String q) { return null; }
+    @SuppressWarnings({"unchecked", "rawtypes"}) void raw() { }
+}
+'''
+
+ENUM = '''public enum Status implements Coded {
+    OPEN("o") { @Override public String label() { return "Open"; } },
+    CLOSED("c"),
+    ;
+    private final String code;
+    Status(String code) { this.code = code; }
+    public String label() { return name(); }
+    public String code() { return code; }
+    enum Inner { A, B; void inner() { } }
+}
+'''
+
+TEXT_BLOCKS = '''import java.sql.Connection;
+public class Queries {
+    static final String SQL = """
+        SELECT "id", '{' FROM orders WHERE a = "}" -- void fake() {
+        """;
+    @Query(value = """
+        select o from Order o where o.id = :id ) (
+        """)
+    public Order byId(long id) { return null; }
+    String other() { return """
+        \\""" still in block
+        """; }
+}
+'''
+
+RECORDS = '''import java.util.List;
+public record Point(int x, @Positive int y) implements Shape {
+    public Point { if (x < 0) throw new IllegalArgumentException(); }
+    public Point(int x) { this(x, 0); }
+    static Point origin() { return new Point(0, 0); }
+    @Override public double area() { return 0; }
+    record Pair<A, B>(A a, List<B> b) { B first() { return b.get(0); } }
+}
+'''
+
+
+def javalangfacts(content):
+    tree = javalang.parse.parse(content)
+    return javaparser.getimports(tree), javaparser.getannotations(tree), javaparser.getmethods(tree)
+
+
+class ScanTest(unittest.TestCase):
+
+    def assertSameFacts(self, content, expected):
+        imports, annotations, methods, sure = javaparser.scan(content)
+        self.assertTrue(sure)
+        self.assertEqual((imports, annotations, methods), expected)
+
+    def test_generics(self):
+        self.assertSameFacts(GENERICS, javalangfacts(GENERICS))
+
+    def test_annotations_with_arguments(self):
+        self.assertSameFacts(ANNOTATIONS, javalangfacts(ANNOTATIONS))
+
+    def test_enum_bodies(self):
+        self.assertSameFacts(ENUM, javalangfacts(ENUM))
+
+    # Braces, parentheses and quotes inside text blocks are not code
+    def test_text_blocks(self):
+        with self.assertRaises(javalang.parser.JavaSyntaxError):
+            javalang.parse.parse(TEXT_BLOCKS)
+        plain = re.sub(r'"""(?:\\.|[^\\])*?"""', '""', TEXT_BLOCKS, flags=re.S)
+        self.assertSameFacts(TEXT_BLOCKS, javalangfacts(plain))
+
+    # Compact and canonical constructors are not methods
+    def test_records(self):
+        self.assertSameFacts(RECORDS, (["java.util.List"], ["Positive", "Override"], ["origin", "area", "first"]))
+
+
+class HttpTest(unittest.TestCase):
+
+    # The catalogs are read from the Extractor folder
+    def setUp(self):
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    def write(self, content):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        path = os.path.join(folder.name, "Client.java")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        return path
+
+    def test_non_ascii_urls(self):
+        path = self.write('String a = "http://kitchen-service:8080/cr\xe8me/br\xfbl\xe9e?q=\xfc"; '
+                          'String b = "http://order-service/orders";\n'
+                          '// https://\u670d\u52a1:8443/\u8def\u5f84 and http://example.com/skipped\n')
+        expected = ["http://kitchen-service:8080/cr\xe8me/br\xfbl\xe9e?q=\xfc", "http://order-service/orders",
+                    "https://\u670d\u52a1:8443/\u8def\u5f84"]
+        self.assertEqual(javaparser.gethttpdb(path), expected)
+        self.assertEqual(javaparser.gethttpdb(path, cheap=True), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
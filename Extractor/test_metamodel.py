@@ -0,0 +1,107 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import metamodel
+
+ROOT = "/work/CurrentMBS/Source"
+
+
+def sample():
+    services = []
+    for i, name in enumerate(["order-service", "kitchen-sérvice", "支付-service"]):
+        services.append({
+            "name": name,
+            "locs": [i, 120 + i, -3, 2 ** 40],
+            "ratio": 0.25 * i,
+            "language": None if i == 1 else "java",
+            "code": {
+                "source_files": [ROOT + "/" + name + "/src/Main.java", ROOT + "/" + name + "/src/Ünïcode.java",
+                                 "/elsewhere/Lib.java"],
+                # Strings the NUL separated blocks cannot hold
+                "imports": ["com.acme.Order", "with\x00nul", "\x01leading", "com.acme.Order"],
+                "methods": [],
+                "http": [["https://api.example.com/ça", None], [[], [[None, True, False]]]]
+            },
+            "deployment": {"docker_files": [], "descriptors": None},
+            "notes": "émoji 🚀, CJK 服务, tab\tand newline\n"
+        })
+    return {
+        "system": {
+            "name": "Sỳstem",
+            "config_files": [ROOT + "/application.yml"],
+            "folders": [],
+            "microservices": services,
+            "calls": [{"from": "order-service", "to": "支付-service", "url": None}],
+            "quarantine": []
+        }
+    }
+
+
+class MetamodelTest(unittest.TestCase):
+
+    def path(self, name):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        return os.path.join(folder.name, name)
+
+    def test_binary_round_trip(self):
+        mm = sample()
+        path = self.path("mm.mmb")
+        metamodel.dump(mm, path, ROOT)
+        self.assertTrue(metamodel.isbinary(path))
+        self.assertEqual(metamodel.load(path), mm)
+
+    def test_guessed_root(self):
+        mm = sample()
+        self.assertEqual(metamodel.loads(metamodel.dumps(mm)), mm)
+
+    def test_json_round_trip(self):
+        mm = sample()
+        path = self.path("mm.json")
+        metamodel.dump(mm, path)
+        self.assertFalse(metamodel.isbinary(path))
+        self.assertEqual(metamodel.load(path), mm)
+
+    # Fields in file order, one entry per microservice
+    def expected(self, mm):
+        fields = []
+        for key, value in mm["system"].items():
+            fields += [(key, service) for service in value] if key == "microservices" else [(key, value)]
+        return fields
+
+    def test_stream(self):
+        mm = sample()
+        for name in ("mm.json", "mm.mmb"):
+            path = self.path(name)
+            metamodel.dump(mm, path, ROOT)
+            self.assertEqual(list(metamodel.stream(path)), self.expected(mm))
+
+    # Chunks a few bytes long split varints, strings and string blocks
+    def test_stream_small_chunks(self):
+        mm = sample()
+        path = self.path("mm.mmb")
+        metamodel.dump(mm, path, ROOT)
+        for chunk in (1, 3, 7):
+            with mock.patch.object(metamodel, "_CHUNK", chunk):
+                self.assertEqual(list(metamodel._streambinary(path)), self.expected(mm))
+
+    def test_stream_no_microservices(self):
+        mm = {"system": {"name": "empty", "microservices": [], "calls": None}}
+        path = self.path("mm.mmb")
+        metamodel.dump(mm, path)
+        self.assertEqual(list(metamodel._streambinary(path)), [("name", "empty"), ("calls", None)])
+
+    def test_truncated(self):
+        path = self.path("mm.mmb")
+        metamodel.dump(sample(), path, ROOT)
+        with open(path, "rb") as f:
+            data = f.read()
+        with open(path, "wb") as f:
+            f.write(data[:len(data) // 2])
+        with self.assertRaises(ValueError):
+            list(metamodel._streambinary(path))
+
+
+if __name__ == "__main__":
+    unittest.main()
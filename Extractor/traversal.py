@@ -0,0 +1,242 @@
+import fnmatch
+import functools
+import os
+import re
+import sources
+
+
+# One pruned walk of the analysed system shared by every file lookup. Whole
+# folders are left out before being walked :
+#   - dependency and tool folders, at any depth (files_needles/excluded_dirs.txt)
+#   - build outputs (files_needles/build_dirs.txt), only next to a build
+#     file : src/main/java/com/acme/build is a package, not an output
+#   - minified, bundled and generated files (files_needles/excluded_files.txt)
+#   - paths listed in CurrentMBS/exclude.txt, one glob per line relative to
+#     the system root ("docs", "*/src/generated", "**/fixtures")
+#   - paths ignored by the .gitignore files of the system
+# find() then keeps the glob.glob conventions the Extractor relied on :
+# hidden folders are not walked, hidden files only match hidden patterns,
+# results come pattern by pattern, folders in walk order.
+
+EXCLUDED_DIRS_FILE = "files_needles/excluded_dirs.txt"
+EXCLUDED_FILES_FILE = "files_needles/excluded_files.txt"
+BUILD_DIRS_FILE = "files_needles/build_dirs.txt"
+BUILD_FILES = ("pom.xml", "build.gradle", "build.gradle.kts")
+
+
+def readlines(path):
+    if not sources.exists(path):
+        return []
+    return [line.strip() for line in sources.readtext(path).splitlines() if line.strip() and not line.startswith("#")]
+
+
+@functools.lru_cache(maxsize=None)
+def excludeddirs():
+    return tuple(readlines(EXCLUDED_DIRS_FILE))
+
+
+@functools.lru_cache(maxsize=None)
+def builddirs():
+    return tuple(readlines(BUILD_DIRS_FILE))
+
+
+# True for a build output folder, `files` being the file names next to it
+def isbuildoutput(name, files):
+    return name in builddirs() and any(build_file in files for build_file in BUILD_FILES)
+
+
+@functools.lru_cache(maxsize=None)
+def excludedfiles():
+    return re.compile("|".join(fnmatch.translate(pattern) for pattern in readlines(EXCLUDED_FILES_FILE)) or "(?!)")
+
+
+# gitignore glob to regex over "/" separated relative paths
+def _globregex(pattern):
+    regex = ""
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            regex += ".*"
+            i += 2
+            continue
+        c = pattern[i]
+        if c == "*":
+            regex += "[^/]*"
+        elif c == "?":
+            regex += "[^/]"
+        elif c == "[" and "]" in pattern[i + 2:]:
+            end = pattern.index("]", i + 2)
+            content = pattern[i + 1:end]
+            if content.startswith("!"):
+                content = "^" + content[1:]
+            regex += "[" + content.replace("\\", "\\\\") + "]"
+            i = end
+        elif c == "\\" and i + 1 < len(pattern):
+            i += 1
+            regex += re.escape(pattern[i])
+        else:
+            regex += re.escape(c)
+        i += 1
+    return re.compile(regex)
+
+
+# Rules of one ignore file (or of exclude.txt), relative to `base` (a path
+# relative to the root of the walk, "" for the root itself)
+def parserules(lines, base=""):
+    rules = []
+    for line in lines:
+        line = line.rstrip()
+        if not line or line.startswith("#"):
+            continue
+        negate = line.startswith("!")
+        if negate:
+            line = line[1:]
+        dironly = line.endswith("/")
+        line = line.rstrip("/")
+        # Without a slash a pattern applies at any depth
+        if "/" in line:
+            line = line.lstrip("/")
+        else:
+            line = "**/" + line
+        rules.append((base, _globregex(line), negate, dironly))
+    return rules
+
+
+def ignored(rules, relpath, isdir):
+    result = False
+    for base, regex, negate, dironly in rules:
+        if dironly and not isdir:
+            continue
+        if base:
+            if not relpath.startswith(base + "/"):
+                continue
+            subpath = relpath[len(base) + 1:]
+        else:
+            subpath = relpath
+        if regex.fullmatch(subpath):
+            result = not negate
+    return result
+
+
+# Exclude.txt lines are anchored at the system root, "docs" only excludes
+# the top-level docs folder
+def excluderules(excluded):
+    return parserules([line if line.startswith(("!", "**")) else "/" + line.lstrip("/") for line in excluded])
+
+
+class Tree(object):
+
+    def __init__(self, root, excluded=()):
+        self.root = root
+        self.excluded = list(excluded)
+        self._walk = None
+        self._outputs = []
+
+    # [(relative folder, file names)] in walk order, "" being the root
+    def walk(self):
+        if self._walk is not None:
+            return self._walk
+        pruned = set(excludeddirs())
+        generated = excludedfiles()
+        rules = excluderules(self.excluded)
+        self._walk = []
+        self._outputs = []
+        stack = [("", rules)]
+        while stack:
+            reldir, rules = stack.pop()
+            folder = os.path.join(self.root, reldir) if reldir else self.root
+            try:
+                entries = sources.listdir(folder, follow_symlinks=False)
+            except OSError:
+                continue
+            if (".gitignore", False) in entries:
+                rules = rules + parserules(readlines(os.path.join(folder, ".gitignore")), reldir)
+            files = []
+            subdirs = []
+            names = [name for name, isdir in entries if not isdir]
+            for name, isdir in entries:
+                relpath = reldir + "/" + name if reldir else name
+                if isdir:
+                    if name.startswith(".") or name in pruned or ignored(rules, relpath, True):
+                        continue
+                    if isbuildoutput(name, names):
+                        self._outputs.append(relpath)
+                        continue
+                    subdirs.append((relpath, rules))
+                elif not generated.match(name) and not ignored(rules, relpath, False):
+                    files.append(name)
+            self._walk.append((reldir, files))
+            stack.extend(reversed(subdirs))
+        return self._walk
+
+    def relative(self, path):
+        relpath = os.path.relpath(path, self.root).replace(os.sep, "/")
+        return "" if relpath == "." else relpath
+
+    def contains(self, path):
+        relpath = os.path.relpath(path, self.root)
+        return relpath != ".." and not relpath.startswith(".." + os.sep)
+
+    # Build output folders pruned under `path`
+    def outputs(self, path):
+        self.walk()
+        base = self.relative(path)
+        return [os.path.join(self.root, relpath) for relpath in self._outputs
+                if not base or relpath.startswith(base + "/")]
+
+    def find(self, path, patterns, recursive=True):
+        base = self.relative(path)
+        folders = [(reldir, files) for reldir, files in self.walk()
+                   if reldir == base or (recursive and (not base or reldir.startswith(base + "/")))]
+        found = []
+        for pattern in patterns:
+            for reldir, files in folders:
+                folder = path + reldir[len(base):] if base else (path + "/" + reldir if reldir else path)
+                for name in files:
+                    if name.startswith(".") and not pattern.startswith("."):
+                        continue
+                    if fnmatch.fnmatchcase(name, pattern):
+                        found.append(folder + "/" + name)
+        return found
+
+
+# Walks are kept per root : the walk of the system serves every service
+_trees = dict()
+
+
+def settree(root, excluded=()):
+    _trees[os.path.normpath(root)] = Tree(root, excluded)
+
+
+def droptree(root):
+    _trees.pop(os.path.normpath(root), None)
+
+
+# Walks again on the next lookup (the daemon calls this after a change)
+def refresh():
+    for tree in _trees.values():
+        tree._walk = None
+
+
+def treefor(path):
+    for tree in _trees.values():
+        if tree.contains(path):
+            return tree
+    _trees[os.path.normpath(path)] = Tree(path)
+    return _trees[os.path.normpath(path)]
+
+
+def find(path, patterns, recursive=True):
+    return treefor(path).find(path, patterns, recursive)
+
+
+def outputs(path):
+    return treefor(path).outputs(path)
+
+
+def isexcluded(excluded, name):
+    return ignored(excluderules(excluded), name, True)
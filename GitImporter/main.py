@@ -1,20 +1,26 @@
 import os
 import sys
 from shutil import copyfile, rmtree
-from git import Repo
 import json
 import time
 import glob
 
-repo_url = sys.argv[1]
 
-print("Cloning " + repo_url + " into current analyser microservice folder...")
-for root, dirs, files in os.walk('../CurrentMBS/Source'):
-    for f in files:
-        os.unlink(os.path.join(root, f))
-    for d in dirs:
-        rmtree(os.path.join(root, d))
+# Clones a repository into the folder the Extractor reads, emptied first.
+# GitPython is only imported here so that importing this module is cheap.
+def clone(repo_url, destination="../CurrentMBS/Source"):
+    from git import Repo
 
-Repo.clone_from(sys.argv[1], "../CurrentMBS/Source")
-print("Cloning done")
+    print("Cloning " + repo_url + " into current analyser microservice folder...")
+    for root, dirs, files in os.walk(destination):
+        for f in files:
+            os.unlink(os.path.join(root, f))
+        for d in dirs:
+            rmtree(os.path.join(root, d))
 
+    Repo.clone_from(repo_url, destination)
+    print("Cloning done")
+
+
+if __name__ == "__main__":
+    clone(sys.argv[1])
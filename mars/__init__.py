@@ -0,0 +1,3 @@
+# MARS : extraction of a metamodel from a microservice system and detection
+# of its antipatterns. Importing the package does nothing, the stages and
+# their dependencies are loaded by the commands that run them (mars.cli).
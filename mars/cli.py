@@ -0,0 +1,146 @@
+import argparse
+import contextlib
+import importlib.util
+import os
+import sys
+
+
+# One command for the whole tool, the stages being loaded only by the
+# commands that need them :
+#   mars clone https://github.com/microservices-patterns/ftgo-application
+#   mars extract --jobs 4 --metamodel ftgo.mmb
+#   mars detect --metamodel ftgo.mmb --rules sharedPersistence
+#   mars run --clone https://github.com/microservices-patterns/ftgo-application
+# The options after extract and detect are those of Extractor/main.py and
+# Detector/main.py. Every stage runs from its folder of the checkout (MARS_HOME,
+# or --home, the folder holding this package by default), the paths given
+# being relative to the current folder.
+
+HOME = os.environ.get("MARS_HOME") or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Options of the stages taking a path
+_PATH_OPTIONS = ("--metamodel", "--repository")
+
+
+def _absolute(argv):
+    paths = []
+    expect = False
+    for arg in argv:
+        name, sep, value = arg.partition("=")
+        if expect:
+            arg = os.path.abspath(arg)
+        elif name in _PATH_OPTIONS and sep:
+            arg = name + "=" + os.path.abspath(value)
+        expect = arg in _PATH_OPTIONS
+        paths.append(arg)
+    return paths
+
+
+# The stages are not part of the package : they read and write next to
+# themselves (CurrentMBS, tools...), a checkout is needed. A non-editable
+# install only holds mars itself, HOME then has to be set.
+def checkout(home=None):
+    home = home or HOME
+    if not os.path.isfile(os.path.join(home, "Extractor", "main.py")):
+        raise FileNotFoundError("no MARS checkout in " + home + ", set MARS_HOME or --home"
+                                " (or install with pip install -e . from the checkout)")
+    return home
+
+
+# Runs in the folder of a stage, the Extractor modules being importable
+@contextlib.contextmanager
+def _stage(home, folder):
+    previous = os.getcwd()
+    extractor = os.path.join(home, "Extractor")
+    if extractor not in sys.path:
+        sys.path.insert(0, extractor)
+    os.chdir(os.path.join(home, folder))
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+# main.py of a stage, loaded once under its own module name (the Extractor
+# one being "main", as the daemon and the history import it)
+def _load(home, folder, name):
+    path = os.path.join(home, folder, "main.py")
+    module = sys.modules.get(name)
+    if module is not None and os.path.abspath(getattr(module, "__file__", "")) == os.path.abspath(path):
+        return module
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[name]
+        raise
+    return module
+
+
+def clone(url, home=None):
+    home = checkout(home)
+    with _stage(home, "GitImporter"):
+        _load(home, "GitImporter", "gitimporter").clone(url)
+
+
+def extract(argv=None, home=None):
+    home = checkout(home)
+    argv = _absolute(argv or [])
+    with _stage(home, "Extractor"):
+        _load(home, "Extractor", "main").main(argv, prog="mars extract")
+
+
+def detect(argv=None, home=None):
+    home = checkout(home)
+    argv = _absolute(argv or [])
+    with _stage(home, "Detector"):
+        _load(home, "Detector", "detector").main(argv, prog="mars detect")
+
+
+# Clone (when a URL is given), extract and detect
+def run(url=None, metamodel=None, argv=None, home=None):
+    home = checkout(home)
+    metamodel = os.path.abspath(metamodel) if metamodel else os.path.join(home, "metamodel.json")
+    if url:
+        clone(url, home)
+    extract(["--metamodel", metamodel] + list(argv or []), home)
+    detect(["--metamodel", metamodel], home)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="mars")
+    parser.add_argument("--home", type=str, default=None,
+                        help="MARS checkout holding the stages (default: " + HOME + ")")
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+    commands.required = True
+    clone_parser = commands.add_parser("clone", help="clone a repository into CurrentMBS/Source")
+    clone_parser.add_argument("url", type=str)
+    # Their own options are read by the stages
+    commands.add_parser("extract", add_help=False, help="write the metamodel of CurrentMBS/Source")
+    commands.add_parser("detect", add_help=False, help="print the antipatterns of a metamodel")
+    run_parser = commands.add_parser("run", help="clone, extract and detect, extract options accepted")
+    run_parser.add_argument("--clone", type=str, default=None, metavar="URL")
+    run_parser.add_argument("--metamodel", type=str, default=None)
+
+    args, rest = parser.parse_known_args(argv)
+    try:
+        home = checkout(os.path.abspath(args.home) if args.home else HOME)
+    except FileNotFoundError as e:
+        parser.error(str(e))
+    if rest and args.command == "clone":
+        parser.error("unrecognized arguments: " + " ".join(rest))
+
+    if args.command == "clone":
+        clone(args.url, home)
+    elif args.command == "extract":
+        extract(rest, home)
+    elif args.command == "detect":
+        detect(rest, home)
+    else:
+        run(args.clone, args.metamodel, rest, home)
+
+
+if __name__ == "__main__":
+    main()